@@ -5,12 +5,29 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/4.1/howto/deployment/asgi/
+
+ASGI deployment, with the async views of the game (game/async_views.py):
+
+    pip install uvicorn
+    ASYNC_VIEWS=True uvicorn Flagdle.asgi:application --workers 4
+
+A worker then keeps serving other players while a guess waits for the database,
+instead of holding a thread per request. DATABASE_PROFILE=production can be combined with it,
+ASYNC_VIEWS turns the persistent connections off.
+The sessions, the score buffer and the ranking are per worker like under WSGI.
 """
 
 import os
 
+from django.conf import settings
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Flagdle.settings')
 
 application = get_asgi_application()
+
+# Load the leaderboard ranking when the worker starts, not on the first leaderboard request
+if settings.LEADERBOARD_RANKING:
+    from game.ranking import ranking
+
+    ranking.start()
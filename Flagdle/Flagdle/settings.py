@@ -50,6 +50,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'game.metrics.MetricsMiddleware',  # first, to measure the whole request
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -94,6 +95,29 @@ DATABASES = {
     }
 }
 
+# Pragmas run on every new SQLite connection (see game/db.py)
+SQLITE_PRAGMAS = {}
+# Score writes answered "database is locked" are retried this many times, after 50ms, 100ms, 200ms...
+SQLITE_BUSY_RETRIES = 0
+SQLITE_BUSY_RETRY_DELAY = 0.05  # seconds
+
+# Production profile, enabled with DATABASE_PROFILE=production.
+# Compare it with the default profile with `python manage.py sqlite_concurrency`.
+if os.getenv('DATABASE_PROFILE') == 'production':
+    DATABASES['default'].update({
+        'CONN_MAX_AGE': None,  # keep the connection of each worker thread open
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {'timeout': 20},  # seconds a write waits for the lock before "database is locked"
+    })
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'wal',  # readers do not block the writer and the writer does not block readers
+        'synchronous': 'normal',  # safe with WAL, fsync at checkpoints instead of at each commit
+        'cache_size': -64000,  # 64MB of page cache per connection
+        'mmap_size': 256 * 1024 * 1024,
+        'temp_store': 'memory',
+    }
+    SQLITE_BUSY_RETRIES = 5
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
@@ -127,16 +151,129 @@ USE_TZ = True
 
 STATICFILES_DIRS = [os.path.join(BASE_DIR, "assets")]
 
+# Responsive variants of the assets, saved by country_border_generator/png_to_webp.py and served under static/variants/
+VARIANTS_DIR = BASE_DIR / 'variants'
+if VARIANTS_DIR.is_dir():
+    STATICFILES_DIRS.append(('variants', VARIANTS_DIR))
+
+# Built with `python manage.py build_asset_manifest`, the asset directories are scanned when it is missing
+ASSET_MANIFEST = BASE_DIR / 'asset_manifest.json'
+
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/4.1/howto/static-files/
 
 STATIC_URL = '/static/'
 
+# Filled by `python manage.py collectstatic`, which names each file after the md5 of its content
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'game.storage.AssetManifestStorage',
+    },
+}
+
+# Cache of the images of the gallery pages (game.views.CatalogFragmentCacheMixin), in the memory of each worker by default.
+# To share it between the workers of a machine use a file-based cache:
+# PAGE_CACHE_BACKEND=django.core.cache.backends.filebased.FileBasedCache PAGE_CACHE_LOCATION=/var/tmp/flagdle_pages
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'pages': {
+        'BACKEND': os.getenv('PAGE_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('PAGE_CACHE_LOCATION', 'pages'),
+        # Entries of an old catalog version are never read again, let them expire
+        'TIMEOUT': 24 * 60 * 60,
+        'OPTIONS': {'MAX_ENTRIES': 1000},
+    },
+}
+PAGE_CACHE = 'pages'
+
+# Number of images of a gallery page, the next ones are loaded while scrolling
+GALLERY_PAGE_SIZE = 48
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.1/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Writes the metrics of the test run to a temporary file, see game/test_runner.py
+TEST_RUNNER = 'game.test_runner.TestRunner'
+
+# Sort the leaderboard with the in-memory ranking of each worker (game.ranking) instead of the database index.
+# It is loaded when the worker starts, then workers only see the best scores raised by other workers after a restart:
+# with several workers, set LEADERBOARD_RANKING=False to read the leaderboard from the database index instead.
+LEADERBOARD_RANKING = os.getenv('LEADERBOARD_RANKING', 'True') == 'True'
+
+# Where the game in progress (deck and scores of the category) is kept between guesses:
+# 'session' in the session store, 'token' in a signed token sent back by the game page with each guess,
+# so guesses do not read nor write the session table
+GAME_STATE = os.getenv('GAME_STATE', 'session')
+GAME_STATE_TOKEN_MAX_AGE = 24 * 60 * 60  # seconds
+
+# Number of upcoming images of the deck the browser is asked to download in advance,
+# by the Link: rel=preload header of the game page, then by the page script after each guess
+PRELOAD_IMAGES = 2
+
+# 'game.sessions' serves the sessions from a per-worker LRU and writes them to the database in batches (see game/sessions.py).
+# The LRU is not shared: with several workers, requests of a user must reach the same worker.
+SESSION_ENGINE = os.getenv('SESSION_ENGINE', 'django.contrib.sessions.backends.db')
+SESSION_LRU_SIZE = 10000  # sessions kept in memory by each worker
+SESSION_FLUSH_INTERVAL = 1.0  # seconds between two batched writes
+SESSION_PURGE_INTERVAL = 60 * 60  # seconds between two purges of the expired sessions
+SESSION_PURGE_BATCH_SIZE = 500  # expired sessions deleted per transaction
+# 'write-behind': a killed worker loses the last SESSION_FLUSH_INTERVAL of session changes
+# 'write-through': every change is written right away, only the reads are served from memory
+SESSION_DURABILITY = os.getenv('SESSION_DURABILITY', 'write-behind')
+
+# Buffer the points of correct guesses in memory and write them in batches (see game/score_buffer.py),
+# so guesses do not wait for the database write lock. Leaderboard totals lag by up to SCORE_BUFFER_FLUSH_MS.
+SCORE_BUFFER = os.getenv('SCORE_BUFFER', '') == 'True'
+SCORE_BUFFER_FLUSH_MS = 200  # milliseconds between two batched writes
+SCORE_BUFFER_FLUSH_EVENTS = 100  # points waiting that trigger a write before the interval
+
+# Write every guess to the append-only guess_event table for analytics (see game/guess_log.py).
+# Guesses are queued in memory and inserted in batches, a killed worker loses the last GUESS_LOG_FLUSH_INTERVAL of them.
+GUESS_LOG = os.getenv('GUESS_LOG', 'True') == 'True'
+GUESS_LOG_BATCH_SIZE = 500  # guesses waiting that trigger a write before the interval, and rows per INSERT
+GUESS_LOG_FLUSH_INTERVAL = 10.0  # seconds between two batched writes
+GUESS_LOG_MAX_PENDING = 20000  # guesses kept waiting at most, the next ones are dropped
+GUESS_LOG_MAX_RETRIES = 3  # failed writes in a row after which the waiting guesses are dropped
+
+# Route the game, the guesses, the score reset and the leaderboard to their async versions (game/async_views.py).
+# Only useful behind an ASGI server, see Flagdle/asgi.py; under WSGI every async view would run in its own event loop.
+ASYNC_VIEWS = os.getenv('ASYNC_VIEWS', '') == 'True'
+if ASYNC_VIEWS:
+    # Persistent connections are not supported by the async views, their queries run on threads outside the request
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+
+# Request metrics (game/metrics.py), exported at /metrics in the Prometheus text format.
+# Each worker adds its counters to this SQLite file every METRICS_FLUSH_INTERVAL seconds, /metrics shows the totals.
+METRICS_DATABASE = os.getenv('METRICS_DATABASE', BASE_DIR / 'metrics.sqlite3')
+METRICS_FLUSH_INTERVAL = 5.0  # seconds
+# Addresses allowed to read /metrics, comma-separated
+METRICS_ALLOWED_IPS = os.getenv('METRICS_ALLOWED_IPS', '127.0.0.1,::1').split(',')
+
+# The info and debug logs of the game are sampled, LOG_SAMPLE_RATE is the share of them written
+# (warnings and errors always are)
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'filters': {
+        'sample': {'()': 'game.metrics.SampleFilter', 'rate': float(os.getenv('LOG_SAMPLE_RATE', '0.01'))},
+    },
+    'handlers': {
+        'sampled_console': {'class': 'logging.StreamHandler', 'filters': ['sample']},
+    },
+    'loggers': {
+        'game': {'handlers': ['sampled_console'], 'level': os.getenv('GAME_LOG_LEVEL', 'INFO'), 'propagate': False},
+    },
+}
+
 LOGIN_REDIRECT_URL = 'home'
 LOGOUT_REDIRECT_URL = ''
 LOGIN_URL = 'login'
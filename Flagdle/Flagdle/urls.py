@@ -13,10 +13,20 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
 from django.contrib import admin
-from django.urls import path
+from django.urls import path, re_path
 from django.contrib.auth import views as auth_views
-from game.views import HomeView, ImagesView, FlagView, GameView, SignUpView, LeaderboardView, reset_current_score
+from game.views import (
+    HomeView, ImagesView, ImagesFragmentView, FlagView, FlagFragmentView, GameView, GuessView, SignUpView, LeaderboardView,
+    metrics, reset_current_score, serve_static,
+)
+
+if settings.ASYNC_VIEWS:
+    from game.async_views import (
+        AsyncGameView as GameView, AsyncGuessView as GuessView, AsyncLeaderboardView as LeaderboardView,
+        areset_current_score as reset_current_score,
+    )
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -25,8 +35,14 @@ urlpatterns = [
     path('Flagdle/logout/', auth_views.LogoutView.as_view(next_page='home'), name='logout'),
     path('Flagdle/', HomeView.as_view(), name='home'),
     path('Flagdle/countries/', ImagesView.as_view(), name='countries'),
+    path('Flagdle/countries/fragment/', ImagesFragmentView.as_view(), name='countries_fragment'),
     path('Flagdle/flags/', FlagView.as_view(), name='flags'),
+    path('Flagdle/flags/fragment/', FlagFragmentView.as_view(), name='flags_fragment'),
     path('Flagdle/game/', GameView.as_view(), name='game'),
+    path('Flagdle/game/guess/', GuessView.as_view(), name='guess'),
     path('reset_current_score', reset_current_score, name='reset_current_score'),
     path('Flagdle/leaderboard/', LeaderboardView.as_view(), name='leaderboard'),
+    path('metrics', metrics, name='metrics'),
+    # Static files and images, `runserver` serves them itself when DEBUG is on
+    re_path(rf"^{settings.STATIC_URL.lstrip('/')}(?P<path>.+)$", serve_static, name='static'),
 ]
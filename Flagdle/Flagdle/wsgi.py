@@ -9,8 +9,15 @@ https://docs.djangoproject.com/en/4.1/howto/deployment/wsgi/
 
 import os
 
+from django.conf import settings
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Flagdle.settings')
 
 application = get_wsgi_application()
+
+# Load the leaderboard ranking when the worker starts, not on the first leaderboard request
+if settings.LEADERBOARD_RANKING:
+    from game.ranking import ranking
+
+    ranking.start()
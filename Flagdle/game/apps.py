@@ -1,6 +1,21 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class GameConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'game'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+
+        from .catalog import asset_catalog
+        from .db import set_sqlite_pragmas
+        from .metrics import install_query_timer
+
+        connection_created.connect(set_sqlite_pragmas)
+        connection_created.connect(install_query_timer)
+
+        # Use the manifest built at deploy time instead of scanning the asset directories
+        if getattr(settings, 'ASSET_MANIFEST', None):
+            asset_catalog.load_manifest(settings.ASSET_MANIFEST)
@@ -0,0 +1,131 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.mixins import LoginRequiredMixin
+from django.http import JsonResponse
+
+from .scores import aget_leaderboard, aget_ranked_leaderboard, aincrement_score, areset_current_scores
+from .views import GameView, GuessView, LeaderboardView
+
+# Views of the game for ASGI servers, routed instead of their sync versions when settings.ASYNC_VIEWS is on.
+# They read and write the scores with the async ORM, so a worker keeps serving other players
+# while a guess waits for the database. The session and the user are loaded once in a thread by dispatch,
+# the rest of the request uses the loaded copies and does not block the event loop.
+
+
+async def load_user(request):
+    """
+    Loads the session and the user of the request, which can not be read from async code.\n
+    Returns True if the user is logged in.
+    """
+    return await sync_to_async(lambda: request.user.is_authenticated)()
+
+
+class AsyncGameView(GameView):
+    """
+    Async version of GameView.
+    """
+
+    async def dispatch(self, request, *args, **kwargs):
+        if not await load_user(request):
+            return self.handle_no_permission()
+        return await super(LoginRequiredMixin, self).dispatch(request, *args, **kwargs)
+
+    def get_scores(self, category):
+        # Set by aload_scores before the page is built
+        return self.scores
+
+    async def aload_scores(self, category):
+        self.scores = await self.game_state.aget_scores(category)
+
+    async def acheck_guess(self, form, directory, category):
+        """
+        Async version of GameView.check_guess.
+        """
+        # In token mode the deck is advanced in the database, which async code can not do
+        correct, message, scored = await sync_to_async(self.judge_guess)(form, directory, category)
+        if scored:
+            best_score_raised = await aincrement_score(self.game_state.username, category)
+            self.game_state.add_point(category, best_score_raised)
+        return correct, message, scored
+
+    async def get(self, request, *args, **kwargs):
+        game, categories, directory = self.get_game_settings()
+        await self.aload_scores(self.get_selected_category(categories))
+        # In token mode the deck in progress is read from the database
+        return self.render_to_response(await sync_to_async(self.get_context_data)())
+
+    async def post(self, request, *args, **kwargs):
+        game, categories, directory = self.get_game_settings()
+        selected_category = self.get_selected_category(categories)
+        form = self.get_form()
+        if not form.is_valid():
+            await self.aload_scores(selected_category)
+            return await sync_to_async(self.form_invalid)(form)
+
+        correct, message, scored = await self.acheck_guess(form, directory, selected_category)
+        await self.aload_scores(selected_category)
+        return self.render_to_response(await sync_to_async(self.get_context_data)(form=form, message=message))
+
+    async def put(self, *args, **kwargs):
+        return await self.post(*args, **kwargs)
+
+
+class AsyncGuessView(GuessView, AsyncGameView):
+    """
+    Async version of GuessView.\n
+    GuessView.dispatch skips the login check in token mode and hands the request to AsyncGameView.dispatch otherwise,
+    either way the handler below returns a coroutine.
+    """
+
+    async def post(self, request, *args, **kwargs):
+        form = self.get_form()
+        if not form.is_valid():
+            return self.form_invalid(form)
+
+        game, categories, directory = self.get_game_settings()
+        selected_category = self.get_selected_category(categories)
+        if not self.game_state.is_valid(selected_category):
+            return JsonResponse({'status': 'fail'}, status=403)
+        correct, message, scored = await self.acheck_guess(form, directory, selected_category)
+        await self.aload_scores(selected_category)
+        return await sync_to_async(self.guess_response)(correct, message, scored, directory, selected_category)
+
+
+async def areset_current_score(request):
+    """
+    Async version of views.reset_current_score.
+    """
+    if request.method == 'POST':
+        await load_user(request)
+        await areset_current_scores(request.user.username)
+        return JsonResponse({'status': 'success'})
+
+    return JsonResponse({'status': 'fail'}, status=400)
+
+
+# file deepcode ignore DisablesCSRFProtection: <not a security issue>
+# @csrf_exempt of Django 4.2 wraps the view in a sync function, which would hide that it is async
+areset_current_score.csrf_exempt = True
+
+
+class AsyncLeaderboardView(LeaderboardView):
+    """
+    Async version of LeaderboardView.
+    """
+
+    def get_leaderboard(self, page, after):
+        # Set by get before the page is built
+        return self.leaderboard
+
+    async def get(self, request, *args, **kwargs):
+        await load_user(request)
+        page = self.get_page()
+        if settings.LEADERBOARD_RANKING:
+            self.leaderboard = await aget_ranked_leaderboard(
+                (page - 1) * self.paginate_by, self.paginate_by + 1, self.get_cursor(),
+            )
+        else:
+            self.leaderboard = await aget_leaderboard(
+                (page - 1) * self.paginate_by, self.paginate_by + 1, self.get_cursor(),
+            )
+        return self.render_to_response(self.get_context_data(**kwargs))
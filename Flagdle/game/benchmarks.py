@@ -0,0 +1,106 @@
+import timeit
+
+from django.contrib.auth.models import AnonymousUser, User
+from django.contrib.sessions.backends.signed_cookies import SessionStore
+from django.template.loader import render_to_string
+from django.test import RequestFactory
+
+from .Base32EncoderDecoder import base32_to_utf8, utf8_to_base32
+from .catalog import get_from_directory, normalize_answer
+from .scores import get_leaderboard, get_ranked_leaderboard
+from .views import GameView, LeaderboardView
+
+# Micro-benchmarks of the hot functions of the game, run by `manage.py benchmark`.
+# Each benchmark prepares its data and returns the function to time.
+BENCHMARKS = {}
+
+ANSWERS = ['Cote d\'Ivoire', 'Sao Tome-et-Principe', 'Iles Salomon', 'Etats-Unis', 'Papouasie-Nouvelle-Guinee']
+GUESSES = ['  Côte-d\'Ivoire ', 'SÃO TOMÉ ET PRÍNCIPE', 'îles salomon', 'États-Unis', 'papouasie nouvelle guinée']
+
+
+def benchmark(function):
+    BENCHMARKS[function.__name__] = function
+    return function
+
+
+def run(names=None, repeat=5, min_time=0.2):
+    """
+    Times the benchmarks, each one is called in loops of at least min_time seconds, repeat times.\n
+    Returns {name: {'median_us', 'min_us', 'loops'}}, the times are per call in microseconds.
+    """
+    results = {}
+    for name in names or BENCHMARKS:
+        timer = timeit.Timer(BENCHMARKS[name]())
+        loops, _ = timer.autorange()
+        loops = max(loops, int(loops * min_time / 0.2))
+        times = sorted(total / loops * 1e6 for total in timer.repeat(repeat=repeat, number=loops))
+        results[name] = {'median_us': times[len(times) // 2], 'min_us': times[0], 'loops': loops}
+    return results
+
+
+def _request(path, user=None):
+    request = RequestFactory().get(path)
+    request.user = user or AnonymousUser()
+    request.session = SessionStore()
+    return request
+
+
+def _benchmark_user():
+    return User.objects.order_by('pk').first() or AnonymousUser()
+
+
+@benchmark
+def get_from_directory_country():
+    return lambda: get_from_directory('country', 'Europe')
+
+
+@benchmark
+def utf8_to_base32_answers():
+    return lambda: [utf8_to_base32(answer) for answer in ANSWERS]
+
+
+@benchmark
+def base32_to_utf8_filenames():
+    filenames = [utf8_to_base32(answer) for answer in ANSWERS]
+    return lambda: [base32_to_utf8(filename) for filename in filenames]
+
+
+@benchmark
+def normalize_guesses():
+    return lambda: [normalize_answer(guess) for guess in GUESSES]
+
+
+@benchmark
+def leaderboard_query():
+    return lambda: get_leaderboard(0, 51)
+
+
+@benchmark
+def ranked_leaderboard():
+    get_ranked_leaderboard(0, 51)  # loads the ranking
+    return lambda: get_ranked_leaderboard(0, 51)
+
+
+@benchmark
+def leaderboard_context():
+    view = LeaderboardView()
+    view.setup(_request('/Flagdle/leaderboard/'))
+    return view.get_context_data
+
+
+@benchmark
+def render_game_page():
+    request = _request('/Flagdle/game/?game=country&category=Europe', _benchmark_user())
+    view = GameView()
+    view.setup(request)
+    context = view.get_context_data()
+    return lambda: render_to_string('game.html', context, request)
+
+
+@benchmark
+def render_leaderboard_page():
+    request = _request('/Flagdle/leaderboard/')
+    view = LeaderboardView()
+    view.setup(request)
+    context = view.get_context_data()
+    return lambda: render_to_string('leaderboard.html', context, request)
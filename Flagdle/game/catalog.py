@@ -0,0 +1,184 @@
+import json
+import os
+import threading
+from collections import namedtuple
+
+from unidecode import unidecode
+
+from .Base32EncoderDecoder import base32_to_utf8
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ASSETS_DIR = os.path.join(BASE_DIR, 'assets')
+# Smaller copies of the assets in several formats, saved by country_border_generator/png_to_webp.py
+VARIANTS_DIR = os.path.join(BASE_DIR, 'variants')
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.webp')
+
+# path is relative to the static root, e.g. 'country/Europe/IZZGC3TDMU======.webp'.
+# hash, size, width, height, variants and placeholder are only known when the catalog is loaded from a manifest.
+# variants are (static path, width, format) of the smaller copies of the image,
+# placeholder is a data URI of a tiny copy shown until the image is loaded.
+CatalogEntry = namedtuple(
+    'CatalogEntry',
+    ['path', 'answer', 'normalized_answer', 'hash', 'size', 'width', 'height', 'variants', 'placeholder'],
+    defaults=(None, None, None, None, None, None),
+)
+
+IMAGE_TYPES = {'avif': 'image/avif', 'webp': 'image/webp'}
+
+
+def normalize_answer(text: str) -> str:
+    """
+    Normalizes a guess or an answer so that both can be compared.
+    """
+    return unidecode(text.strip().lower()).replace('-', ' ')
+
+
+def image_sources(entry):
+    """
+    Returns the (mime type, [(static path, width)]) of each format an image is available in, best format first.\n
+    The image itself is the largest candidate of its own format.
+    """
+    candidates = {image_format: [] for image_format in IMAGE_TYPES}
+    for path, width, image_format in entry.variants or ():
+        candidates.setdefault(image_format, []).append((path, width))
+
+    image_format = os.path.splitext(entry.path)[1][1:].lower()
+    if entry.width and image_format in candidates:
+        candidates[image_format].append((entry.path, entry.width))
+
+    return [
+        (IMAGE_TYPES.get(image_format, f'image/{image_format}'), sorted(paths, key=lambda path: path[1]))
+        for image_format, paths in candidates.items()
+        if len(paths) > 1 or (paths and paths[0][0] != entry.path)
+    ]
+
+
+def get_from_directory(directory, subdirectory, root=ASSETS_DIR):
+    """
+    Lists the images of an asset directory.\n
+    Returns (static path, filename without extension) tuples.
+    """
+    directory_path = os.path.join(root, directory, subdirectory)
+    images = []
+    if os.path.exists(directory_path):
+        for filename in os.listdir(directory_path):
+            if filename.endswith(IMAGE_EXTENSIONS) and 'icon' not in filename:
+                filename_without_extension = os.path.splitext(filename)[0]
+                images.append(('/'.join(filter(None, (directory, subdirectory, filename))), filename_without_extension))
+    return images
+
+
+class AssetCatalog:
+    """
+    Process-wide index of the images of each category.\n
+    When a manifest built by `manage.py build_asset_manifest` is loaded, the asset directories are never read.
+    Otherwise a category is scanned on first use and rescanned only when the mtime of its directory changes.
+    """
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        self.manifest = None
+        self._lock = threading.Lock()
+        self._categories = {}
+
+    def load_manifest(self, manifest_path):
+        """
+        Replaces the directory scans with the content of a manifest file.\n
+        Returns False if the manifest does not exist.
+        """
+        try:
+            with open(manifest_path, encoding='utf-8') as manifest_file:
+                manifest = json.load(manifest_file)
+        except FileNotFoundError:
+            return False
+
+        fields = manifest['fields']
+        categories = {}
+        for key, images in manifest['categories'].items():
+            entries = tuple(CatalogEntry(**dict(zip(fields, image))) for image in images)
+            categories[key] = (None, entries, {entry.path: index for index, entry in enumerate(entries)})
+
+        with self._lock:
+            self.manifest = manifest
+            self._categories = categories
+        return True
+
+    def _lookup(self, directory, category):
+        # Categories come from the query string, only accept plain directory names
+        key = f'{directory}/{category}'
+        if not directory or not category or os.path.normpath(key) != os.path.join(directory, category):
+            return (), {}
+
+        if self.manifest is not None:
+            cached = self._categories.get(key)
+            return cached[1:] if cached is not None else ((), {})
+
+        try:
+            mtime = os.stat(os.path.join(self.root, directory, category)).st_mtime_ns
+        except OSError:
+            return (), {}
+
+        cached = self._categories.get(key)
+        if cached is not None and cached[0] == mtime:
+            return cached[1:]
+
+        with self._lock:
+            cached = self._categories.get(key)
+            if cached is None or cached[0] != mtime:
+                entries = []
+                for path, filename in get_from_directory(directory, category, self.root):
+                    answer = base32_to_utf8(filename)
+                    entries.append(CatalogEntry(path, answer, normalize_answer(answer)))
+                entries = tuple(sorted(entries))
+                cached = (mtime, entries, {entry.path: index for index, entry in enumerate(entries)})
+                self._categories[key] = cached
+        return cached[1:]
+
+    def get(self, directory, category):
+        """
+        Returns the entries of a category, sorted by path.
+        """
+        return self._lookup(directory, category)[0]
+
+    def find(self, directory, category, path):
+        """
+        Returns the entry of a category matching a static path, or None.
+        """
+        entries, indexes = self._lookup(directory, category)
+        index = indexes.get(path)
+        return entries[index] if index is not None else None
+
+    def index_of(self, directory, category, path):
+        """
+        Returns the position of a static path in the entries of a category, or None.
+        """
+        return self._lookup(directory, category)[1].get(path)
+
+    def atlas(self, directory, category):
+        """
+        Returns the thumbnail atlas of a category recorded in the manifest, or None.
+        """
+        if self.manifest is None:
+            return None
+        return self.manifest.get('atlases', {}).get(f'{directory}/{category}')
+
+    def version(self, directory, category):
+        """
+        Returns a string that changes whenever the images of a category change, or None if the category does not exist.
+        """
+        entries = self._lookup(directory, category)[0]
+        if not entries:
+            return None
+        if self.manifest is not None:
+            return self.manifest['version']
+        # The mtime of the directory changes when images are added, removed or renamed
+        return str(self._categories[f'{directory}/{category}'][0])
+
+    def clear(self):
+        with self._lock:
+            self.manifest = None
+            self._categories = {}
+
+
+asset_catalog = AssetCatalog(ASSETS_DIR)
@@ -0,0 +1,148 @@
+import asyncio
+import contextlib
+import functools
+import logging
+import random
+import sqlite3
+import threading
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, OperationalError, connection, connections
+
+logger = logging.getLogger(__name__)
+
+
+def set_sqlite_pragmas(sender, connection, **kwargs):
+    """
+    Applies settings.SQLITE_PRAGMAS to every new SQLite connection.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for pragma, value in settings.SQLITE_PRAGMAS.items():
+            cursor.execute(f'PRAGMA {pragma} = {value}')
+
+
+def retry_on_busy(function):
+    """
+    Runs a database write again when SQLite answers "database is locked",
+    up to settings.SQLITE_BUSY_RETRIES times with an exponential backoff.\n
+    Only use it on writes that are left undone by the error, e.g. a single statement or an atomic block.
+    """
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        for attempt in range(settings.SQLITE_BUSY_RETRIES):
+            try:
+                return function(*args, **kwargs)
+            except OperationalError as error:
+                # Inside a transaction the whole transaction has to be retried, not this write
+                if 'locked' not in str(error) or connection.in_atomic_block:
+                    raise
+            time.sleep(_backoff(attempt))
+        return function(*args, **kwargs)
+    return wrapper
+
+
+def aretry_on_busy(function):
+    """
+    retry_on_busy for coroutines, the backoff does not block the event loop.\n
+    Async code can not open transactions, so every write it retries is a single statement.
+    """
+    @functools.wraps(function)
+    async def wrapper(*args, **kwargs):
+        for attempt in range(settings.SQLITE_BUSY_RETRIES):
+            try:
+                return await function(*args, **kwargs)
+            except OperationalError as error:
+                if 'locked' not in str(error):
+                    raise
+            await asyncio.sleep(_backoff(attempt))
+        return await function(*args, **kwargs)
+    return wrapper
+
+
+def _backoff(attempt):
+    return settings.SQLITE_BUSY_RETRY_DELAY * 2 ** attempt * random.uniform(0.5, 1.5)
+
+
+class FlushThread:
+    """
+    Daemon thread writing a buffer of this worker to the database in the background.\n
+    Calls flush every interval() seconds, or as soon as wake is called, from the first call to start
+    until the worker exits. Errors are logged and the next call tries again.
+    The thread closes its database connections after each call, nothing else would close them.
+    """
+
+    def __init__(self, name, flush, interval):
+        self.name = name
+        self._flush = flush
+        self._interval = interval
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                    self._thread.start()
+
+    def wake(self):
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self._interval())
+            self._wake.clear()
+            try:
+                self._flush()
+            except Exception:
+                logger.exception('The %s thread could not write to the database', self.name)
+            finally:
+                connections.close_all()
+
+
+@contextlib.contextmanager
+def database_copy(source, path, **database_settings):
+    """
+    Points the default database to a migrated copy of the SQLite file source, saved at path, during the block.\n
+    database_settings replace those of the default database (CONN_MAX_AGE, OPTIONS...) during the block too.\n
+    The guesses, points and sessions buffered in memory are written before and after the block,
+    so those of the block go to the copy and not to the default database.
+    """
+    from django.core.management import call_command
+
+    with sqlite3.connect(source) as source_connection, sqlite3.connect(path) as copy_connection:
+        source_connection.backup(copy_connection)
+
+    flush_buffers()
+    settings_dict = connections.settings['default']
+    saved_settings = dict(settings_dict)
+    connections.close_all()
+    settings_dict.update(database_settings, NAME=path)
+    try:
+        call_command('migrate', verbosity=0)
+        yield
+    finally:
+        flush_buffers()
+        connections.close_all()
+        settings_dict.clear()
+        settings_dict.update(saved_settings)
+
+
+def flush_buffers():
+    """
+    Writes the guess log, the score buffer and the session buffer of this worker to the default database.
+    """
+    from .guess_log import guess_log
+    from .score_buffer import score_buffer
+    from .sessions import session_buffer
+
+    guess_log.flush(raise_errors=False)
+    score_buffer.flush(raise_errors=False)
+    try:
+        session_buffer.flush()
+    except DatabaseError:
+        logger.exception('Could not write the sessions to the database')
@@ -0,0 +1,51 @@
+import random
+
+
+def new_seed():
+    return random.getrandbits(32)
+
+
+def _mix(value, key):
+    # murmur3 finalizer, enough to scramble a Feistel half
+    value = (value ^ key) & 0xFFFFFFFF
+    value ^= value >> 16
+    value = (value * 0x85EBCA6B) & 0xFFFFFFFF
+    value ^= value >> 13
+    value = (value * 0xC2B2AE35) & 0xFFFFFFFF
+    value ^= value >> 16
+    return value
+
+
+class Deck:
+    """
+    Seeded permutation of range(size): deck[position] is the catalog index of the image dealt at that position.\n
+    Positions are computed one by one with a Feistel network, so dealing an image is O(1) and
+    nothing but the seed and a cursor has to be stored to resume a run.
+    The same seed always deals the same images in the same order.
+    """
+    ROUNDS = 4
+
+    def __init__(self, seed, size):
+        self.size = size
+        self._half_bits = max(1, ((size - 1).bit_length() + 1) // 2)
+        self._half_mask = (1 << self._half_bits) - 1
+        seeded_random = random.Random(seed)
+        self._keys = [seeded_random.getrandbits(32) for _ in range(self.ROUNDS)]
+
+    def __len__(self):
+        return self.size
+
+    def _permute(self, value):
+        left, right = value >> self._half_bits, value & self._half_mask
+        for key in self._keys:
+            left, right = right, left ^ (_mix(right, key) & self._half_mask)
+        return left << self._half_bits | right
+
+    def __getitem__(self, position):
+        if not 0 <= position < self.size:
+            raise IndexError('deck position out of range')
+        # The network permutes the next power of 4, walk the cycle until the value falls back in range
+        value = self._permute(position)
+        while value >= self.size:
+            value = self._permute(value)
+        return value
@@ -6,8 +6,11 @@ from django.contrib.auth.forms import UserCreationForm
 # form to manage guess submissions.
 class GuessForm(forms.Form):
     current_image = forms.CharField(widget=forms.HiddenInput())
-    correct_answer = forms.CharField(widget=forms.HiddenInput())
     guess = forms.CharField(label='Your Guess', max_length=100)
+    # Milliseconds between the image being shown and the guess, set by global.js for the guess log
+    latency_ms = forms.IntegerField(
+        widget=forms.HiddenInput(), required=False, min_value=0, max_value=24 * 60 * 60 * 1000,
+    )
 
 
 # form to create an account.
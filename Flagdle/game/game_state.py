@@ -0,0 +1,194 @@
+from django.conf import settings
+from django.core import signing
+
+from .db import retry_on_busy
+from .models import GameProgress
+from .scores import aget_score, get_score
+
+
+class SessionGameState:
+    """
+    Keeps the deck of each category in the session, the player is the logged-in user.
+    """
+
+    def __init__(self, request):
+        self.request = request
+
+    @property
+    def username(self):
+        return self.request.user.username
+
+    def is_valid(self, category):
+        return self.request.user.is_authenticated
+
+    def get_deck(self, category):
+        return self.request.session.get(f'deck_{category}')
+
+    def set_deck(self, category, deck):
+        self.request.session[f'deck_{category}'] = deck
+
+    def advance_deck(self, category, deck):
+        """
+        Moves the cursor of the deck to the next image.\n
+        Returns False if the game state was already used at this cursor, the guess must not score then.
+        """
+        seed, size, cursor = deck
+        self.set_deck(category, [seed, size, cursor + 1])
+        return True
+
+    def clear_deck(self, category):
+        self.request.session.pop(f'deck_{category}', None)
+
+    def clear_decks(self, categories):
+        for category in categories:
+            self.clear_deck(category)
+
+    def get_scores(self, category):
+        return get_score(self.username, category)
+
+    async def aget_scores(self, category):
+        return await aget_score(self.username, category)
+
+    def add_point(self, category, best_score_raised):
+        pass
+
+    def dumps(self):
+        return None
+
+
+class TokenGameState:
+    """
+    Keeps the game in progress in a signed token sent back by the game page with each guess,
+    so guesses never read nor write the session.\n
+    The token holds the player, the category, the deck and the scores shown on the page.
+    The scores are only a copy for display, they are always written to the database.\n
+    A token is only accepted once: the deck dealt by the game page and the cursor reached in it are kept
+    in the game_progress table, a guess only scores if it moves that cursor forward with a compare-and-set.
+    Guesses never deal a deck, so a client can not pick the deck it scores on.
+    """
+    salt = 'game.game_state'
+
+    def __init__(self, request):
+        self.request = request
+        self._username = None
+        self._category = None
+        self._deck = None
+        self._scores = None
+        self._from_token = False
+        self._progress_read = False
+
+        token = request.POST.get('game_state')
+        if token:
+            self._from_token = True
+            try:
+                self._username, self._category, self._deck, self._scores = signing.loads(
+                    token, salt=self.salt, max_age=settings.GAME_STATE_TOKEN_MAX_AGE,
+                )
+            except (signing.BadSignature, ValueError, TypeError):
+                pass
+
+    @property
+    def username(self):
+        # Without a token the game page is being rendered for the logged-in user
+        if self._username is None:
+            self._username = self.request.user.username
+        return self._username
+
+    def is_valid(self, category):
+        return self._username is not None and self._category == category
+
+    def _select(self, category):
+        if self._category != category:
+            self._category = category
+            self._deck = None
+            self._scores = None
+            self._progress_read = False
+
+    def get_deck(self, category):
+        self._select(category)
+        if not self._from_token and not self._progress_read:
+            # The game page continues the deck in progress instead of dealing a new one
+            self._progress_read = True
+            progress = GameProgress.objects.filter(username=self.username, category=category).values_list(
+                'seed', 'size', 'cursor',
+            ).first()
+            self._deck = list(progress) if progress else None
+        return self._deck
+
+    def set_deck(self, category, deck):
+        self._select(category)
+        self._deck = deck
+        if not self._from_token:
+            _save_progress(self.username, category, deck)
+
+    def advance_deck(self, category, deck):
+        seed, size, cursor = deck
+        if not _advance_progress(self.username, category, seed, cursor):
+            return False
+        self._deck = [seed, size, cursor + 1]
+        return True
+
+    def clear_deck(self, category):
+        self.clear_decks([category])
+
+    def clear_decks(self, categories):
+        if self._category in categories:
+            self._deck = None
+        if self.request.user.is_authenticated:
+            GameProgress.objects.filter(username=self.username, category__in=categories).delete()
+
+    def get_scores(self, category):
+        self._select(category)
+        if self._scores is None:
+            self._scores = list(get_score(self.username, category))
+        return tuple(self._scores)
+
+    async def aget_scores(self, category):
+        self._select(category)
+        if self._scores is None:
+            self._scores = list(await aget_score(self.username, category))
+        return tuple(self._scores)
+
+    def add_point(self, category, best_score_raised):
+        self._select(category)
+        if self._scores is not None:
+            current_score, best_score = self._scores
+            self._scores = [current_score + 1, current_score + 1 if best_score_raised else best_score]
+
+    def dumps(self):
+        return signing.dumps(
+            [self.username, self._category, self._deck, self._scores], salt=self.salt, compress=True,
+        )
+
+
+@retry_on_busy
+def _save_progress(username, category, deck):
+    seed, size, cursor = deck
+    GameProgress.objects.bulk_create(
+        [GameProgress(username=username, category=category, seed=seed, size=size, cursor=cursor)],
+        update_conflicts=True,
+        unique_fields=['username', 'category'],
+        update_fields=['seed', 'size', 'cursor'],
+    )
+
+
+@retry_on_busy
+def _advance_progress(username, category, seed, cursor):
+    """
+    Moves the progress of a user in a category from cursor to cursor + 1 of the deck seed.\n
+    Returns False if it is not at this cursor, i.e. the token was already used or its deck is not the one dealt.
+    """
+    return bool(
+        GameProgress.objects.filter(username=username, category=category, seed=seed, cursor=cursor).update(
+            cursor=cursor + 1,
+        )
+    )
+
+
+def get_game_state(request):
+    """
+    Returns the storage of the game in progress selected by settings.GAME_STATE.
+    """
+    if settings.GAME_STATE == 'token':
+        return TokenGameState(request)
+    return SessionGameState(request)
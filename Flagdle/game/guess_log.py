@@ -0,0 +1,83 @@
+import atexit
+import logging
+import threading
+
+from django.conf import settings
+from django.utils import timezone
+
+from .db import FlushThread
+from .models import GuessEvent
+
+logger = logging.getLogger(__name__)
+
+
+class GuessLog:
+    """
+    Per-worker queue of the guesses written to the append-only guess_event table.\n
+    Recording a guess only appends it to a list in memory, a background thread bulk-inserts the list every
+    GUESS_LOG_FLUSH_INTERVAL seconds, or as soon as GUESS_LOG_BATCH_SIZE guesses are waiting.
+    Guesses still waiting are written when the worker exits.\n
+    The log is best effort: at most GUESS_LOG_MAX_PENDING guesses wait, newer ones are dropped,
+    and guesses whose insert failed GUESS_LOG_MAX_RETRIES times in a row are dropped too.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # One flush at a time, so the guesses put back after a failure keep their order
+        self._flush_lock = threading.Lock()
+        self._pending = []
+        self._failures = 0  # flushes failed in a row
+        self._dropped = 0  # guesses dropped since the last warning
+        self._thread = FlushThread(
+            'guess-log', lambda: self.flush(raise_errors=False), lambda: settings.GUESS_LOG_FLUSH_INTERVAL,
+        )
+
+    def record(self, username, category, image, correct, latency_ms=None):
+        event = GuessEvent(
+            username=username, category=category, image=image, correct=correct,
+            latency_ms=latency_ms, created_at=timezone.now(),
+        )
+        with self._lock:
+            if len(self._pending) >= settings.GUESS_LOG_MAX_PENDING:
+                # The database is not keeping up, the guesses are not worth the memory
+                self._dropped += 1
+                return
+            self._pending.append(event)
+            if len(self._pending) >= settings.GUESS_LOG_BATCH_SIZE:
+                self._thread.wake()
+        self._thread.start()
+
+    def flush(self, raise_errors=True):
+        """
+        Inserts the waiting guesses, GUESS_LOG_BATCH_SIZE rows per query.
+        """
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, []
+                dropped, self._dropped = self._dropped, 0
+            if dropped:
+                logger.warning('Dropped %d guesses, the guess log had %d waiting', dropped, len(pending))
+            if not pending:
+                return
+            try:
+                GuessEvent.objects.bulk_create(pending, batch_size=settings.GUESS_LOG_BATCH_SIZE)
+            except Exception:
+                self._failures += 1
+                if self._failures >= settings.GUESS_LOG_MAX_RETRIES:
+                    self._failures = 0
+                    logger.exception('Dropped %d guesses that could not be written to the guess log', len(pending))
+                    return
+                # Put the guesses back, they are retried on the next flush
+                with self._lock:
+                    self._pending[:0] = pending
+                    self._dropped += max(len(self._pending) - settings.GUESS_LOG_MAX_PENDING, 0)
+                    del self._pending[settings.GUESS_LOG_MAX_PENDING:]
+                if raise_errors:
+                    raise
+                logger.exception('Could not write %d guesses to the guess log', len(pending))
+                return
+            self._failures = 0
+
+
+guess_log = GuessLog()
+atexit.register(guess_log.flush, raise_errors=False)
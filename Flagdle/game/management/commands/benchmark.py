@@ -0,0 +1,66 @@
+import json
+import os
+import platform
+import tempfile
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from game import benchmarks
+from game.db import database_copy
+
+DEFAULT_BASELINE = os.path.join(settings.BASE_DIR, 'benchmarks', 'baseline.json')
+
+
+def run_benchmarks(names, repeat, database=None):
+    """
+    Runs the benchmarks against a copy of the database, returns the results with the versions they were run with.
+    """
+    unknown = set(names or ()) - set(benchmarks.BENCHMARKS)
+    if unknown:
+        raise CommandError(f"Unknown benchmarks: {', '.join(sorted(unknown))}")
+
+    source = database or settings.DATABASES['default']['NAME']
+    with tempfile.TemporaryDirectory() as directory, database_copy(source, os.path.join(directory, 'benchmark.sqlite3')):
+        results = benchmarks.run(names, repeat)
+    return {
+        'created': timezone.now().isoformat(),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'machine': platform.machine(),
+        # Timings only compare on the same kind of machine
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'benchmarks': results,
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Times the hot functions of the game (asset listing, base32 names, guess normalization, leaderboard, '
+        'page rendering). With --save the results become the baseline compared by compare_benchmarks.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs='*', help='Benchmarks to run, all by default.')
+        parser.add_argument('--repeat', type=int, default=5, help='Number of timings of each benchmark.')
+        parser.add_argument('--database', help='SQLite database to copy and read, defaults to the configured one.')
+        parser.add_argument(
+            '--save', nargs='?', const=DEFAULT_BASELINE,
+            help=f'Write the results to this JSON file, {DEFAULT_BASELINE} when no file is given.',
+        )
+
+    def handle(self, *args, **options):
+        results = run_benchmarks(options['names'], options['repeat'], options['database'])
+
+        self.stdout.write(f"{'benchmark':<28}{'median us':>12}{'min us':>12}{'loops':>10}")
+        for name, result in results['benchmarks'].items():
+            self.stdout.write(f"{name:<28}{result['median_us']:>12.1f}{result['min_us']:>12.1f}{result['loops']:>10}")
+
+        if options['save']:
+            os.makedirs(os.path.dirname(os.path.abspath(options['save'])), exist_ok=True)
+            with open(options['save'], 'w') as file:
+                json.dump(results, file, indent=2)
+            self.stdout.write(f"Saved to {options['save']}")
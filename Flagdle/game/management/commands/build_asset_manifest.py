@@ -0,0 +1,131 @@
+import base64
+import hashlib
+import io
+import json
+import os
+import re
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from PIL import Image
+
+from game.Base32EncoderDecoder import base32_to_utf8
+from game.catalog import ASSETS_DIR, VARIANTS_DIR, CatalogEntry, IMAGE_EXTENSIONS, normalize_answer
+
+# Width and height of the low-quality placeholders, in pixels
+PLACEHOLDER_SIZE = 16
+
+# <name>.<width>w.<format>, see country_border_generator/png_to_webp.py
+VARIANT_NAME = re.compile(r'^(?P<name>.+)\.(?P<width>\d+)w\.(?P<format>\w+)$')
+
+
+class Command(BaseCommand):
+    help = 'Walks the asset directories once and writes the manifest loaded by the asset catalog at startup.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--assets', default=ASSETS_DIR, help='Root of the asset directories.')
+        parser.add_argument('--variants', default=VARIANTS_DIR, help='Root of the responsive variants of the assets.')
+        parser.add_argument('--output', default=settings.ASSET_MANIFEST, help='Path of the manifest file.')
+
+    def handle(self, *args, **options):
+        assets_dir = os.path.abspath(options['assets'])
+        categories = {}
+        atlases = {}
+        manifest_hash = hashlib.md5()
+
+        for root, directories, filenames in os.walk(assets_dir):
+            directories.sort()
+            relative_root = os.path.relpath(root, assets_dir).replace(os.sep, '/')
+            variants = self.get_variants(os.path.join(options['variants'], relative_root), relative_root)
+            entries = []
+            for filename in sorted(filenames):
+                if not filename.endswith(IMAGE_EXTENSIONS) or 'icon' in filename:
+                    continue
+                file_path = os.path.join(root, filename)
+                with open(file_path, 'rb') as image_file:
+                    content = image_file.read()
+                with Image.open(file_path) as image:
+                    width, height = image.size
+                    placeholder = self.get_placeholder(image)
+
+                name = os.path.splitext(filename)[0]
+                answer = base32_to_utf8(name)
+                entries.append(CatalogEntry(
+                    path=f'{relative_root}/{filename}',
+                    answer=answer,
+                    normalized_answer=normalize_answer(answer),
+                    # Same hash as the one used by Django's hashed static files
+                    hash=hashlib.md5(content).hexdigest()[:12],
+                    size=len(content),
+                    width=width,
+                    height=height,
+                    variants=variants.get(name, []),
+                    placeholder=placeholder,
+                ))
+                manifest_hash.update(entries[-1].path.encode('utf-8'))
+                manifest_hash.update(content)
+                for variant in entries[-1].variants:
+                    manifest_hash.update(variant[0].encode('utf-8'))
+
+            if entries:
+                categories[relative_root] = [list(entry) for entry in sorted(entries)]
+                atlas = self.get_atlas(os.path.join(options['variants'], relative_root), relative_root)
+                if atlas:
+                    atlases[relative_root] = atlas
+                    manifest_hash.update(json.dumps(atlas, sort_keys=True).encode('utf-8'))
+
+        manifest = {
+            'version': manifest_hash.hexdigest()[:12],
+            'fields': list(CatalogEntry._fields),
+            'categories': categories,
+            'atlases': atlases,
+        }
+        with open(options['output'], 'w', encoding='utf-8') as manifest_file:
+            json.dump(manifest, manifest_file, ensure_ascii=False, separators=(',', ':'))
+
+        image_count = sum(len(entries) for entries in categories.values())
+        self.stdout.write(self.style.SUCCESS(
+            f'Wrote {image_count} images in {len(categories)} categories to {options["output"]}'
+        ))
+
+    def get_placeholder(self, image):
+        """
+        Returns a tiny copy of an image as a data URI, shown blurred by the galleries until the image is loaded.
+        """
+        thumbnail = image.convert('RGB')
+        thumbnail.thumbnail((PLACEHOLDER_SIZE, PLACEHOLDER_SIZE))
+        buffer = io.BytesIO()
+        thumbnail.save(buffer, 'WEBP', quality=30)
+        return 'data:image/webp;base64,' + base64.b64encode(buffer.getvalue()).decode('ascii')
+
+    def get_atlas(self, directory, relative_root):
+        """
+        Returns the thumbnail atlas of a category saved by country_border_generator/png_to_webp.py, or None:
+        {"path", "width", "height", "images": {static path of the image: [x, y, width, height]}}.
+        """
+        try:
+            with open(os.path.join(directory, 'atlas.json'), encoding='utf-8') as index_file:
+                index = json.load(index_file)
+        except FileNotFoundError:
+            return None
+        return {
+            'path': f'variants/{relative_root}/atlas.webp',
+            'width': index['width'],
+            'height': index['height'],
+            'images': {f'{relative_root}/{filename}': position for filename, position in index['images'].items()},
+        }
+
+    def get_variants(self, directory, relative_root):
+        """
+        Returns the [static path, width, format] of the variants of each image of a directory, by image name.
+        """
+        variants = {}
+        if not os.path.isdir(directory):
+            return variants
+        for filename in sorted(os.listdir(directory)):
+            match = VARIANT_NAME.match(filename)
+            if match:
+                variants.setdefault(match['name'], []).append(
+                    [f'variants/{relative_root}/{filename}', int(match['width']), match['format']]
+                )
+        return variants
@@ -0,0 +1,69 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from .benchmark import DEFAULT_BASELINE, run_benchmarks
+
+
+class Command(BaseCommand):
+    help = (
+        'Compares benchmark results with a baseline saved by `benchmark --save` and fails '
+        'when a benchmark is slower than the baseline by more than the threshold.\n'
+        'The committed baseline was timed on the machine recorded in it; on another machine '
+        '(e.g. a CI runner) save a baseline there first, from the commit to compare against.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'results', nargs='?',
+            help='Results saved by `benchmark --save` to compare. By default the benchmarks of the baseline are run now.',
+        )
+        parser.add_argument('--baseline', default=DEFAULT_BASELINE, help=f'Baseline file, {DEFAULT_BASELINE} by default.')
+        parser.add_argument('--threshold', type=float, default=10.0, help='Slowdown in percent flagged as a regression.')
+        parser.add_argument('--repeat', type=int, default=5, help='Number of timings of each benchmark run now.')
+        parser.add_argument('--database', help='SQLite database to copy and read for the benchmarks run now.')
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['baseline']) as file:
+                baseline_results = json.load(file)
+        except FileNotFoundError:
+            raise CommandError(f"No baseline at {options['baseline']}, save one with `manage.py benchmark --save`.")
+        baseline = baseline_results['benchmarks']
+
+        if options['results']:
+            with open(options['results']) as file:
+                current_results = json.load(file)
+        else:
+            current_results = run_benchmarks(list(baseline), options['repeat'], options['database'])
+        current = current_results['benchmarks']
+
+        machines = [(results.get('platform'), results.get('cpus')) for results in (baseline_results, current_results)]
+        if machines[0] != machines[1]:
+            self.stdout.write(self.style.WARNING(
+                f'The baseline was timed on {machines[0][0]} ({machines[0][1]} CPUs) and the results on '
+                f'{machines[1][0]} ({machines[1][1]} CPUs), the changes are not only those of the code.'
+            ))
+
+        regressions = []
+        self.stdout.write(f"{'benchmark':<28}{'baseline us':>14}{'current us':>14}{'change':>10}")
+        for name, result in current.items():
+            if name not in baseline:
+                self.stdout.write(f"{name:<28}{'-':>14}{result['median_us']:>14.1f}{'new':>10}")
+                continue
+            before, after = baseline[name]['median_us'], result['median_us']
+            change = (after - before) / before * 100
+            line = f'{name:<28}{before:>14.1f}{after:>14.1f}{change:>+9.1f}%'
+            if change > options['threshold']:
+                regressions.append(name)
+                self.stdout.write(self.style.ERROR(f'{line}  REGRESSION'))
+            elif change < -options['threshold']:
+                self.stdout.write(self.style.SUCCESS(f'{line}  faster'))
+            else:
+                self.stdout.write(line)
+
+        if regressions:
+            raise CommandError(
+                f"{len(regressions)} benchmark(s) slower than the baseline by more than {options['threshold']}%: "
+                f"{', '.join(regressions)}"
+            )
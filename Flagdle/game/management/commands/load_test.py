@@ -0,0 +1,290 @@
+import http.cookiejar
+import json
+import os
+import random
+import re
+import secrets
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection, connections
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+from game.catalog import asset_catalog
+from game.db import database_copy
+
+# game -> (directory, categories)
+GAMES = {
+    'country': ('country', ['Afrique', 'Amerique', 'Asie', 'Europe', 'Moyen-Orient', 'Oceanie']),
+    'flag': ('flags', ['World', 'Pride']),
+}
+
+CURRENT_IMAGE = re.compile(r'name="current_image" value="([^"]+)"')
+GAME_STATE = re.compile(r'name="game_state" value="([^"]*)"')
+QUERIES_METRIC = re.compile(r'^flagdle_db_queries_per_request_(sum|count)\{view="([^"]+)"\} (\S+)$', re.MULTILINE)
+
+
+class TestClientPlayer:
+    """
+    Sends the requests of a player through Django's test client, in this process.
+    """
+
+    def __init__(self):
+        self.client = Client()
+
+    def request(self, method, path, data=None):
+        """
+        Returns the (status, body, number of queries) of a request.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            if method == 'GET':
+                response = self.client.get(path)
+            else:
+                response = self.client.post(path, data or {})
+        # The test client keeps the connection open, close it like the request handler does
+        close_old_connections()
+        return response.status_code, response.content.decode(), len(queries)
+
+
+class HttpPlayer:
+    """
+    Sends the requests of a player to a running server, keeping its cookies and its CSRF token like a browser.
+    """
+
+    class NoRedirect(urllib.request.HTTPRedirectHandler):
+        def redirect_request(self, *args, **kwargs):
+            return None
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+        self.cookies = http.cookiejar.CookieJar()
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(self.cookies), self.NoRedirect)
+
+    def request(self, method, path, data=None):
+        headers = {'Referer': self.base_url + path}
+        body = None
+        if method == 'POST':
+            csrf_token = next((cookie.value for cookie in self.cookies if cookie.name == settings.CSRF_COOKIE_NAME), '')
+            headers['X-CSRFToken'] = csrf_token
+            body = urllib.parse.urlencode({**(data or {}), 'csrfmiddlewaretoken': csrf_token}).encode()
+        request = urllib.request.Request(self.base_url + path, data=body, headers=headers, method=method)
+        try:
+            with self.opener.open(request, timeout=30) as response:
+                return response.status, response.read().decode(), None
+        except urllib.error.HTTPError as error:
+            return error.code, error.read().decode(errors='replace'), None
+
+
+class Command(BaseCommand):
+    help = (
+        'Simulates players signing up, logging in and playing the game (game page, guesses, leaderboard) in parallel, '
+        'then prints the throughput, the p50/p95/p99 latency and the queries per request of each URL name.\n'
+        'Runs offline through the test client against a copy of the database unless --url is given.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--players', type=int, default=8, help='Number of players playing at the same time.')
+        parser.add_argument('--rounds', type=int, default=5, help='Number of games (category) played by each player.')
+        parser.add_argument('--guesses', type=int, default=10, help='Number of guesses per game.')
+        parser.add_argument('--accuracy', type=float, default=0.7, help='Share of correct guesses.')
+        parser.add_argument(
+            '--form-posts', action='store_true',
+            help='Send the guesses to the game page like browsers without JavaScript, instead of the guess endpoint.',
+        )
+        parser.add_argument(
+            '--database',
+            help='SQLite database to copy and play against, e.g. one made by seed_dataset. Defaults to the configured one.',
+        )
+        parser.add_argument(
+            '--url',
+            help='Base URL of a running server to play against instead, e.g. http://localhost:8000. '
+                 'Players are created in its database. Queries per request are read from its /metrics.',
+        )
+        parser.add_argument('--seed', type=int, help='Seed of the random choices of the players.')
+        parser.add_argument('--json', help='Also write the results to this file, to compare runs.')
+
+    def handle(self, *args, **options):
+        if options['url']:
+            queries_before = self.read_queries_metric(options['url'])
+            elapsed, records = self.run_players(lambda: HttpPlayer(options['url']), options)
+            queries = self.diff_queries_metric(queries_before, self.read_queries_metric(options['url']))
+        else:
+            source = options['database'] or settings.DATABASES['default']['NAME']
+            with tempfile.TemporaryDirectory() as directory, override_settings(
+                ALLOWED_HOSTS=['testserver'], METRICS_DATABASE=os.path.join(directory, 'metrics.sqlite3'),
+            ), database_copy(source, os.path.join(directory, 'load_test.sqlite3')):
+                try:
+                    elapsed, records = self.run_players(TestClientPlayer, options)
+                finally:
+                    connections.close_all()
+            queries = None
+
+        results = self.summarize(elapsed, records, queries)
+        self.report(results)
+        if options['json']:
+            with open(options['json'], 'w') as file:
+                json.dump(results, file, indent=2)
+
+    def run_players(self, make_player, options):
+        """
+        Plays the sessions of every player in its own thread.\n
+        Returns the elapsed time and the (url name, seconds, status, queries) of every request.
+        """
+        rng = random.Random(options['seed'])
+        run = secrets.token_hex(4)
+        records = []
+        start = threading.Barrier(options['players'] + 1)
+        threads = [
+            threading.Thread(
+                target=self.play,
+                args=(make_player(), f'load_{run}_{i}', random.Random(rng.random()), options, start, records),
+            )
+            for i in range(options['players'])
+        ]
+        for thread in threads:
+            thread.start()
+        start.wait()
+        started = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        return time.perf_counter() - started, records
+
+    def play(self, player, username, rng, options, start, records):
+        def call(url_name, method, path, data=None):
+            began = time.perf_counter()
+            try:
+                status, body, queries = player.request(method, path, data)
+            except Exception as error:
+                records.append((url_name, time.perf_counter() - began, None, None))
+                self.stderr.write(f'{url_name}: {error}')
+                return None, ''
+            records.append((url_name, time.perf_counter() - began, status, queries))
+            return status, body
+
+        password = secrets.token_urlsafe(12)
+        start.wait()
+        try:
+            call('signup', 'GET', reverse('signup'))
+            call('signup', 'POST', reverse('signup'), {
+                'username': username, 'email': f'{username}@example.com', 'password1': password, 'password2': password,
+            })
+            call('logout', 'POST', reverse('logout'))
+            call('login', 'GET', reverse('login'))
+            call('login', 'POST', reverse('login'), {'username': username, 'password': password})
+            call('home', 'GET', reverse('home'))
+
+            for _ in range(options['rounds']):
+                game = rng.choice(list(GAMES))
+                directory, categories = GAMES[game]
+                category = rng.choice(categories)
+                query = '?' + urllib.parse.urlencode({'game': game, 'category': category})
+
+                status, page = call('game', 'GET', reverse('game') + query)
+                image, game_state = self.parse_game_page(page)
+                for _ in range(options['guesses']):
+                    if image is None:
+                        break
+                    entry = asset_catalog.find(directory, category, image)
+                    guess = entry.answer if entry is not None and rng.random() < options['accuracy'] else 'Atlantis'
+                    data = {'current_image': image, 'guess': guess}
+                    if game_state:
+                        data['game_state'] = game_state
+
+                    if options['form_posts']:
+                        status, page = call('game', 'POST', reverse('game') + query, data)
+                        image, game_state = self.parse_game_page(page)
+                        continue
+                    status, body = call('guess', 'POST', reverse('guess') + query, data)
+                    if status != 200:
+                        break
+                    answer = json.loads(body)
+                    image = answer['next_image']['path'] if answer['next_image'] else None
+                    game_state = answer['game_state']
+
+                call('leaderboard', 'GET', reverse('leaderboard'))
+        finally:
+            connections.close_all()
+
+    @staticmethod
+    def parse_game_page(page):
+        image = CURRENT_IMAGE.search(page)
+        game_state = GAME_STATE.search(page)
+        return image.group(1) if image else None, game_state.group(1) if game_state else None
+
+    @staticmethod
+    def read_queries_metric(url):
+        """
+        Returns the {view: [sum, count]} of flagdle_db_queries_per_request of a server, or None if /metrics is closed.
+        """
+        try:
+            with urllib.request.urlopen(url.rstrip('/') + reverse('metrics'), timeout=30) as response:
+                text = response.read().decode()
+        except urllib.error.URLError:
+            return None
+        values = {}
+        for kind, view, value in QUERIES_METRIC.findall(text):
+            values.setdefault(view, [0, 0])[kind == 'count'] = float(value)
+        return values
+
+    @staticmethod
+    def diff_queries_metric(before, after):
+        if before is None or after is None:
+            return None
+        return {
+            view: (total - before.get(view, [0, 0])[0]) / (count - before.get(view, [0, 0])[1])
+            for view, (total, count) in after.items()
+            if count > before.get(view, [0, 0])[1]
+        }
+
+    @staticmethod
+    def summarize(elapsed, records, queries=None):
+        """
+        Returns the results per URL name, queries are the queries per request per URL name read from /metrics.
+        """
+        by_url = {}
+        for url_name, seconds, status, request_queries in records:
+            by_url.setdefault(url_name, []).append((seconds, status, request_queries))
+
+        def percentile(latencies, fraction):
+            return latencies[min(int(len(latencies) * fraction), len(latencies) - 1)] * 1000
+
+        urls = {}
+        for url_name, url_records in sorted(by_url.items()):
+            latencies = sorted(seconds for seconds, status, request_queries in url_records)
+            counted = [request_queries for seconds, status, request_queries in url_records if request_queries is not None]
+            if counted:
+                queries_per_request = sum(counted) / len(counted)
+            else:
+                queries_per_request = (queries or {}).get(url_name)
+            urls[url_name] = {
+                'requests': len(url_records),
+                'errors': sum(1 for seconds, status, request_queries in url_records if status is None or status >= 400),
+                'requests_per_second': len(url_records) / elapsed,
+                'p50_ms': percentile(latencies, 0.50),
+                'p95_ms': percentile(latencies, 0.95),
+                'p99_ms': percentile(latencies, 0.99),
+                'queries_per_request': queries_per_request,
+            }
+        return {'elapsed': elapsed, 'requests_per_second': len(records) / elapsed, 'urls': urls}
+
+    def report(self, results):
+        self.stdout.write(
+            f"{'url name':<14}{'requests':>10}{'errors':>8}{'req/s':>10}"
+            f"{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'queries':>10}"
+        )
+        for url_name, result in results['urls'].items():
+            queries = result['queries_per_request']
+            self.stdout.write(
+                f"{url_name:<14}{result['requests']:>10}{result['errors']:>8}{result['requests_per_second']:>10.1f}"
+                f"{result['p50_ms']:>10.1f}{result['p95_ms']:>10.1f}{result['p99_ms']:>10.1f}"
+                f"{'-' if queries is None else f'{queries:.1f}':>10}"
+            )
+        self.stdout.write(f"{results['elapsed']:.1f}s, {results['requests_per_second']:.1f} requests/s")
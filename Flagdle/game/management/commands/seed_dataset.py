@@ -0,0 +1,145 @@
+import random
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.contrib.sessions.backends.base import VALID_KEY_CHARS
+from django.contrib.sessions.backends.db import SessionStore
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError, connection, transaction
+from django.utils import timezone
+from django.utils.crypto import get_random_string
+
+from game.catalog import asset_catalog
+from game.db import database_copy
+from game.models import Score, TotalScore
+
+# category -> asset directory
+CATEGORY_DIRECTORIES = {
+    'Afrique': 'country', 'Amerique': 'country', 'Asie': 'country', 'Europe': 'country',
+    'Moyen-Orient': 'country', 'Oceanie': 'country', 'World': 'flags', 'Pride': 'flags',
+}
+
+# Share of the players who played each category, the smaller categories and the flags are played more
+PLAY_RATES = {
+    'Afrique': 0.35, 'Amerique': 0.3, 'Asie': 0.3, 'Europe': 0.55,
+    'Moyen-Orient': 0.2, 'Oceanie': 0.15, 'World': 0.6, 'Pride': 0.25,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Bulk-creates players with scores in the categories they played, their leaderboard totals and active sessions, '
+        'to reproduce the leaderboard and the session table at production scale. '
+        'Every player has the same password, hashed once.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100000, help='Number of players to create.')
+        parser.add_argument('--prefix', default='seed_', help='Prefix of the usernames, followed by the player number.')
+        parser.add_argument('--password', default='flagdle-seed', help='Password of every player.')
+        parser.add_argument('--sessions', type=float, default=0.2, help='Share of the players with an active session.')
+        parser.add_argument(
+            '--expired-sessions', type=float, default=0.1,
+            help='Share of the players with an expired session, left for the session purge.',
+        )
+        parser.add_argument('--batch-size', type=int, default=10000, help='Players inserted per transaction.')
+        parser.add_argument('--seed', type=int, help='Seed of the random scores.')
+        parser.add_argument(
+            '--output',
+            help='Seed a copy of the configured database saved at this path (replacing it), '
+                 'e.g. for `load_test --database`, instead of the configured database itself.',
+        )
+
+    def handle(self, *args, **options):
+        if options['output']:
+            with database_copy(settings.DATABASES['default']['NAME'], options['output']):
+                self.seed(options)
+        else:
+            self.seed(options)
+
+    def seed(self, options):
+        rng = random.Random(options['seed'])
+        sizes = {
+            category: len(asset_catalog.get(directory, category)) for category, directory in CATEGORY_DIRECTORIES.items()
+        }
+        # Hashing is the slow part of creating a user, every player shares the same hash
+        password = make_password(options['password'])
+        session_hash = User(password=password).get_session_auth_hash()
+
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                # Only the inserts of this command are at risk if the machine crashes, they can be run again
+                cursor.execute('PRAGMA synchronous = OFF')
+
+        started = time.perf_counter()
+        created = {'scores': 0, 'sessions': 0}
+        for first in range(0, options['users'], options['batch_size']):
+            numbers = range(first, min(first + options['batch_size'], options['users']))
+            try:
+                with transaction.atomic():
+                    self.seed_batch(numbers, options, rng, sizes, password, session_hash, created)
+            except IntegrityError as error:
+                raise CommandError(f"{error}. Players {options['prefix']}* already exist, use another --prefix.")
+            self.stdout.write(
+                f"{numbers.stop} players, {created['scores']} scores, {created['sessions']} sessions "
+                f"in {time.perf_counter() - started:.1f}s"
+            )
+
+    def seed_batch(self, numbers, options, rng, sizes, password, session_hash, created):
+        now = timezone.now()
+        width = len(str(options['users'] - 1))
+        usernames = [f"{options['prefix']}{number:0{width}}" for number in numbers]
+        users = User.objects.bulk_create([
+            User(username=username, password=password, date_joined=now - timedelta(days=rng.uniform(0, 730)))
+            for username in usernames
+        ])
+
+        scores = []
+        totals = []
+        for username in usernames:
+            total = 0
+            for category, play_rate in PLAY_RATES.items():
+                if rng.random() >= play_rate:
+                    continue
+                # Most players stop early, a few go through most of the category
+                best_score = min(int(rng.expovariate(1 / max(sizes[category] * 0.25, 1))), sizes[category])
+                current_score = rng.randint(0, best_score)
+                scores.append(Score(
+                    username=username, category=category, current_score=current_score, best_score=best_score,
+                ))
+                total += best_score
+            if total:
+                totals.append(TotalScore(username=username, total_best_score=total))
+        Score.objects.bulk_create(scores)
+        TotalScore.objects.bulk_create(totals)
+
+        # The users are fetched back for their id, bulk_create only sets it on some databases
+        if users[0].pk is None:
+            users = User.objects.filter(username__in=usernames).only('pk')
+        store = SessionStore()
+        sessions = []
+        for user in users:
+            draw = rng.random()
+            if draw < options['sessions']:
+                expire_date = now + timedelta(seconds=rng.uniform(0, settings.SESSION_COOKIE_AGE))
+            elif draw < options['sessions'] + options['expired_sessions']:
+                expire_date = now - timedelta(seconds=rng.uniform(0, settings.SESSION_COOKIE_AGE))
+            else:
+                continue
+            session_data = store.encode({
+                SESSION_KEY: str(user.pk),
+                BACKEND_SESSION_KEY: settings.AUTHENTICATION_BACKENDS[0],
+                HASH_SESSION_KEY: session_hash,
+            })
+            sessions.append(Session(
+                session_key=get_random_string(32, VALID_KEY_CHARS), session_data=session_data, expire_date=expire_date,
+            ))
+        Session.objects.bulk_create(sessions)
+
+        created['scores'] += len(scores)
+        created['sessions'] += len(sessions)
@@ -0,0 +1,125 @@
+import os
+import re
+import statistics
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, close_old_connections, connections
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from game.catalog import asset_catalog
+from game.db import database_copy
+
+COUNTRY_CATEGORIES = ['Afrique', 'Amerique', 'Asie', 'Europe', 'Moyen-Orient', 'Oceanie']
+
+TUNED_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'cache_size': -64000,
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'memory',
+}
+
+# name -> (pragmas, database settings, busy retries), each profile adds one change to the previous one
+PROFILES = {
+    'default': ({'journal_mode': 'delete'}, {'CONN_MAX_AGE': 0, 'OPTIONS': {}}, 0),
+    'wal': ({'journal_mode': 'wal'}, {'CONN_MAX_AGE': 0, 'OPTIONS': {}}, 0),
+    'wal-tuned': (TUNED_PRAGMAS, {'CONN_MAX_AGE': 0, 'OPTIONS': {}}, 0),
+    'persistent': (TUNED_PRAGMAS, {'CONN_MAX_AGE': None, 'OPTIONS': {}}, 0),
+    # Same as DATABASE_PROFILE=production in the settings
+    'production': (TUNED_PRAGMAS, {'CONN_MAX_AGE': None, 'OPTIONS': {'timeout': 20}}, 5),
+}
+
+CURRENT_IMAGE = re.compile(r'name="current_image" value="([^"]+)"')
+
+
+class Command(BaseCommand):
+    help = (
+        'Runs parallel players guessing through the game page against a copy of the database, '
+        'once per SQLite profile, and prints the throughput, latency and "database is locked" errors of each.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--guessers', type=int, default=8, help='Number of players guessing at the same time.')
+        parser.add_argument('--guesses', type=int, default=50, help='Number of guesses of each player.')
+        parser.add_argument(
+            '--profile', action='append', choices=list(PROFILES),
+            help='Profile to run, can be repeated. All profiles are run by default.',
+        )
+
+    def handle(self, *args, **options):
+        source = settings.DATABASES['default']['NAME']
+
+        self.stdout.write(f"{'profile':<12}{'guesses/s':>12}{'p50 ms':>10}{'p95 ms':>10}{'locked':>10}")
+        with tempfile.TemporaryDirectory() as directory:
+            for name in options['profile'] or PROFILES:
+                pragmas, profile_settings, retries = PROFILES[name]
+
+                # Every profile starts from a copy of the database, the journal mode is stored in the file
+                path = os.path.join(directory, f'{name}.sqlite3')
+                with override_settings(
+                    SQLITE_PRAGMAS=pragmas, SQLITE_BUSY_RETRIES=retries, ALLOWED_HOSTS=['testserver'],
+                ), database_copy(source, path, **profile_settings):
+                    elapsed, latencies, errors = self.run_guessers(options['guessers'], options['guesses'])
+
+                latencies.sort()
+                p50 = statistics.median(latencies) * 1000 if latencies else 0
+                p95 = latencies[int(len(latencies) * 0.95)] * 1000 if latencies else 0
+                self.stdout.write(f'{name:<12}{len(latencies) / elapsed:>12.1f}{p50:>10.1f}{p95:>10.1f}{errors:>10}')
+
+    def run_guessers(self, guessers, guesses):
+        users = [User.objects.get_or_create(username=f'concurrency_guesser_{i}')[0] for i in range(guessers)]
+        latencies = []
+        errors = []
+        start = threading.Barrier(guessers + 1)
+        threads = [
+            threading.Thread(
+                target=self.guess,
+                args=(user, COUNTRY_CATEGORIES[i % len(COUNTRY_CATEGORIES)], guesses, start, latencies, errors),
+            )
+            for i, user in enumerate(users)
+        ]
+        for thread in threads:
+            thread.start()
+        start.wait()
+        started = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        return time.perf_counter() - started, latencies, len(errors)
+
+    def guess(self, user, category, guesses, start, latencies, errors):
+        client = Client()
+        client.force_login(user)
+        url = f"{reverse('game')}?game=country&category={category}"
+        page = client.get(url).content.decode()
+        # The test client keeps the connection open, close it like the request handler does
+        close_old_connections()
+        start.wait()
+
+        try:
+            for _ in range(guesses):
+                current_image = CURRENT_IMAGE.search(page)
+                if current_image is None:
+                    # Every image of the category was guessed, start over
+                    page = client.get(url).content.decode()
+                    close_old_connections()
+                    continue
+                image = current_image.group(1)
+                answer = asset_catalog.find('country', category, image).answer
+
+                began = time.perf_counter()
+                try:
+                    page = client.post(url, {'current_image': image, 'guess': answer}).content.decode()
+                except OperationalError:
+                    errors.append(image)
+                else:
+                    latencies.append(time.perf_counter() - began)
+                close_old_connections()
+        finally:
+            connections.close_all()
@@ -0,0 +1,258 @@
+import atexit
+import contextvars
+import logging
+import random
+import sqlite3
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from .db import FlushThread
+
+# name -> (type, help) of the metrics exported at /metrics, in the order they are exported
+METRICS = {
+    'flagdle_requests_total': ('counter', 'Requests answered, by view, method and status.'),
+    'flagdle_request_duration_seconds': ('histogram', 'Time spent answering a request, by view.'),
+    'flagdle_response_size_bytes': ('histogram', 'Size of the response bodies, by view.'),
+    'flagdle_db_queries_per_request': ('histogram', 'Database queries run by a request, by view.'),
+    'flagdle_db_query_duration_seconds': ('histogram', 'Time spent in each database query, by view.'),
+    'flagdle_session_reads_total': ('counter', 'Requests that read the session, by view.'),
+    'flagdle_session_writes_total': ('counter', 'Requests that saved the session, by view.'),
+}
+
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+
+class MetricsStore:
+    """
+    Counters and histograms of the requests, shared by the workers through the SQLite file settings.METRICS_DATABASE.\n
+    Each worker adds to its own counters in memory, a background thread adds them to the file
+    every METRICS_FLUSH_INTERVAL seconds, so the file holds the totals of every worker.
+    The counters waiting are written when the worker exits.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}  # (name, labels, le) -> value added since the last flush
+        self._thread = FlushThread('metrics-flush', self.flush, lambda: settings.METRICS_FLUSH_INTERVAL)
+        self._created = False
+
+    def inc(self, name, labels, value=1):
+        key = (name, labels, '')
+        with self._lock:
+            self._pending[key] = self._pending.get(key, 0) + value
+        self._thread.start()
+
+    def observe(self, name, labels, value, buckets):
+        """
+        Adds a value to a histogram: to the count of each bucket it fits in, to its sum and to its count.
+        """
+        with self._lock:
+            # Empty buckets are kept too, every series of a histogram has the same buckets
+            for le, fits in [*((str(bucket), value <= bucket) for bucket in buckets), ('+Inf', True)]:
+                key = (f'{name}_bucket', labels, le)
+                self._pending[key] = self._pending.get(key, 0) + fits
+            for key, amount in (((f'{name}_sum', labels, ''), value), ((f'{name}_count', labels, ''), 1)):
+                self._pending[key] = self._pending.get(key, 0) + amount
+        self._thread.start()
+
+    def _connect(self):
+        db = sqlite3.connect(settings.METRICS_DATABASE, timeout=5)
+        if not self._created:
+            db.execute('PRAGMA journal_mode = wal')
+            db.execute(
+                'CREATE TABLE IF NOT EXISTS metrics ('
+                'name TEXT NOT NULL, labels TEXT NOT NULL, le TEXT NOT NULL, value REAL NOT NULL, '
+                'PRIMARY KEY (name, labels, le))'
+            )
+            self._created = True
+        return db
+
+    def flush(self):
+        """
+        Adds the counters of this worker to the file.
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return
+        try:
+            db = self._connect()
+            try:
+                with db:
+                    db.executemany(
+                        'INSERT INTO metrics (name, labels, le, value) VALUES (?, ?, ?, ?) '
+                        'ON CONFLICT (name, labels, le) DO UPDATE SET value = value + excluded.value',
+                        [(name, labels, le, value) for (name, labels, le), value in pending.items()],
+                    )
+            finally:
+                db.close()
+        except sqlite3.Error:
+            # Put the counters back, they are retried on the next flush
+            with self._lock:
+                for key, value in pending.items():
+                    self._pending[key] = self._pending.get(key, 0) + value
+            raise
+
+    def export(self):
+        """
+        Returns the totals of every worker in the Prometheus text format.
+        """
+        self.flush()
+        db = self._connect()
+        try:
+            rows = db.execute('SELECT name, labels, le, value FROM metrics').fetchall()
+        finally:
+            db.close()
+
+        series = {}
+        for name, labels, le, value in rows:
+            family = name
+            for suffix in ('_bucket', '_sum', '_count'):
+                if name.endswith(suffix) and name[:-len(suffix)] in METRICS:
+                    family = name[:-len(suffix)]
+            series.setdefault(family, []).append((name, labels, le, value))
+
+        lines = []
+        for family, (metric_type, help_text) in METRICS.items():
+            lines.append(f'# HELP {family} {help_text}')
+            lines.append(f'# TYPE {family} {metric_type}')
+            # Buckets in increasing order, then the sum and the count of each set of labels
+            for name, labels, le, value in sorted(series.get(family, []), key=_series_order):
+                if le:
+                    labels = f'{labels},le="{le}"' if labels else f'le="{le}"'
+                value = int(value) if float(value).is_integer() else value
+                lines.append(f'{name}{{{labels}}} {value}' if labels else f'{name} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+def _series_order(row):
+    name, labels, le, value = row
+    return labels, name.endswith('_count'), name.endswith('_sum'), float(le) if le else 0
+
+
+def format_labels(**labels):
+    return ','.join(
+        f'{key}="' + str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+        for key, value in labels.items()
+    )
+
+
+metrics_store = MetricsStore()
+atexit.register(metrics_store.flush)
+
+
+class RequestMetrics:
+    """
+    Database queries of the request being answered.
+    """
+
+    def __init__(self):
+        self.queries = 0
+        self.query_durations = []
+
+
+# Set by MetricsMiddleware, async views keep it in the threads their queries run on
+_current_request = contextvars.ContextVar('metrics_request', default=None)
+
+
+def time_query(execute, sql, params, many, context):
+    """
+    Execute wrapper counting and timing the queries run while answering a request.
+    """
+    request_metrics = _current_request.get()
+    if request_metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        request_metrics.queries += 1
+        request_metrics.query_durations.append(time.perf_counter() - started)
+
+
+def install_query_timer(sender, connection, **kwargs):
+    """
+    Adds time_query to every new database connection.
+    """
+    if time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(time_query)
+
+
+class MetricsMiddleware:
+    """
+    Records the latency, the response size, the database queries and the session use of each request in metrics_store.\n
+    Put it first in MIDDLEWARE so the time spent by the other middleware and the session save are included.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        started, token = time.perf_counter(), _current_request.set(RequestMetrics())
+        try:
+            response = self.get_response(request)
+            self.record(request, response, time.perf_counter() - started, _current_request.get())
+        finally:
+            _current_request.reset(token)
+        return response
+
+    async def __acall__(self, request):
+        started, token = time.perf_counter(), _current_request.set(RequestMetrics())
+        try:
+            response = await self.get_response(request)
+            self.record(request, response, time.perf_counter() - started, _current_request.get())
+        finally:
+            _current_request.reset(token)
+        return response
+
+    def record(self, request, response, duration, request_metrics):
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else 'unmatched'
+        labels = format_labels(view=view)
+
+        metrics_store.inc(
+            'flagdle_requests_total', format_labels(view=view, method=request.method, status=response.status_code),
+        )
+        metrics_store.observe('flagdle_request_duration_seconds', labels, duration, DURATION_BUCKETS)
+
+        if response.streaming:
+            size = response.headers.get('Content-Length')
+        else:
+            size = len(response.content)
+        if size is not None:
+            metrics_store.observe('flagdle_response_size_bytes', labels, int(size), SIZE_BUCKETS)
+
+        metrics_store.observe('flagdle_db_queries_per_request', labels, request_metrics.queries, QUERY_COUNT_BUCKETS)
+        for query_duration in request_metrics.query_durations:
+            metrics_store.observe('flagdle_db_query_duration_seconds', labels, query_duration, DURATION_BUCKETS)
+
+        session = getattr(request, 'session', None)
+        if session is not None and session.accessed:
+            metrics_store.inc('flagdle_session_reads_total', labels)
+        if session is not None and session.modified:
+            metrics_store.inc('flagdle_session_writes_total', labels)
+
+
+class SampleFilter(logging.Filter):
+    """
+    Logging filter letting through a random share of the records below WARNING, so logging on hot paths stays cheap.
+    """
+
+    def __init__(self, rate=1.0):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        return record.levelno >= logging.WARNING or random.random() < self.rate
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.14 on 2026-10-18 06:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0006_rename_flag_best_score_bestscore_world_best_score_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Score',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('username', models.CharField(max_length=150)),
+                ('category', models.CharField(max_length=50)),
+                ('current_score', models.IntegerField(default=0)),
+                ('best_score', models.IntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'score_user',
+                'managed': True,
+                'unique_together': {('username', 'category')},
+            },
+        ),
+    ]
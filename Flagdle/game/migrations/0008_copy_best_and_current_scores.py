@@ -0,0 +1,70 @@
+from django.db import migrations
+
+CATEGORIES = ['Afrique', 'Amerique', 'Asie', 'Europe', 'Moyen-Orient', 'Oceanie', 'World', 'Pride']
+
+
+def score_field_prefix(category):
+    return category.lower().replace('-', '_')
+
+
+def copy_scores(apps, schema_editor):
+    """
+    Splits the best_score_user and current_score_user rows into one Score per (user, category).
+    """
+    BestScore = apps.get_model('game', 'BestScore')
+    CurrentScore = apps.get_model('game', 'CurrentScore')
+    Score = apps.get_model('game', 'Score')
+
+    scores = {}
+    for best_score in BestScore.objects.all():
+        for category in CATEGORIES:
+            value = getattr(best_score, f'{score_field_prefix(category)}_best_score')
+            scores.setdefault((best_score.username, category), [0, 0])[1] = value
+    for current_score in CurrentScore.objects.all():
+        for category in CATEGORIES:
+            value = getattr(current_score, f'{score_field_prefix(category)}_current_score')
+            scores.setdefault((current_score.username, category), [0, 0])[0] = value
+
+    Score.objects.bulk_create(
+        [
+            Score(username=username, category=category, current_score=current, best_score=max(best, current))
+            for (username, category), (current, best) in scores.items()
+            if current or best
+        ],
+        batch_size=500,
+    )
+
+
+def uncopy_scores(apps, schema_editor):
+    BestScore = apps.get_model('game', 'BestScore')
+    CurrentScore = apps.get_model('game', 'CurrentScore')
+    Score = apps.get_model('game', 'Score')
+
+    best_scores = {}
+    current_scores = {}
+    for score in Score.objects.all():
+        if score.category not in CATEGORIES:
+            continue
+        prefix = score_field_prefix(score.category)
+        best_scores.setdefault(score.username, {})[f'{prefix}_best_score'] = score.best_score
+        current_scores.setdefault(score.username, {})[f'{prefix}_current_score'] = score.current_score
+
+    BestScore.objects.bulk_create(
+        [BestScore(username=username, **fields) for username, fields in best_scores.items()],
+        batch_size=500,
+    )
+    CurrentScore.objects.bulk_create(
+        [CurrentScore(username=username, **fields) for username, fields in current_scores.items()],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0007_score'),
+    ]
+
+    operations = [
+        migrations.RunPython(copy_scores, uncopy_scores),
+    ]
@@ -0,0 +1,17 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0008_copy_best_and_current_scores'),
+    ]
+
+    operations = [
+        migrations.DeleteModel(
+            name='BestScore',
+        ),
+        migrations.DeleteModel(
+            name='CurrentScore',
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.14 on 2026-10-18 06:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0009_delete_bestscore_currentscore'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TotalScore',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('username', models.CharField(max_length=150, unique=True)),
+                ('total_best_score', models.IntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'total_score_user',
+                'managed': True,
+                'indexes': [models.Index(fields=['-total_best_score', 'username'], name='total_score_ranking_idx')],
+            },
+        ),
+    ]
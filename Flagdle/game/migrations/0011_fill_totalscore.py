@@ -0,0 +1,24 @@
+from django.db import migrations
+from django.db.models import Sum
+
+
+def fill_total_scores(apps, schema_editor):
+    Score = apps.get_model('game', 'Score')
+    TotalScore = apps.get_model('game', 'TotalScore')
+
+    totals = Score.objects.values('username').annotate(total_best_score=Sum('best_score'))
+    TotalScore.objects.bulk_create(
+        [TotalScore(username=total['username'], total_best_score=total['total_best_score']) for total in totals],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0010_totalscore'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_total_scores, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.14 on 2026-10-18 06:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0011_fill_totalscore'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GuessEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('username', models.CharField(max_length=150)),
+                ('category', models.CharField(max_length=50)),
+                ('image', models.CharField(max_length=255)),
+                ('correct', models.BooleanField()),
+                ('latency_ms', models.PositiveIntegerField(blank=True, null=True)),
+                ('created_at', models.DateTimeField()),
+            ],
+            options={
+                'db_table': 'guess_event',
+                'managed': True,
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.14 on 2026-10-18 07:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0012_guessevent'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GameProgress',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('username', models.CharField(max_length=150)),
+                ('category', models.CharField(max_length=50)),
+                ('seed', models.BigIntegerField()),
+                ('cursor', models.IntegerField()),
+            ],
+            options={
+                'db_table': 'game_progress',
+                'managed': True,
+                'unique_together': {('username', 'category')},
+            },
+        ),
+    ]
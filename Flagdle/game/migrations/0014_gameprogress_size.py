@@ -0,0 +1,18 @@
+# Generated by Django 4.2.14 on 2026-10-18 07:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0013_gameprogress'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gameprogress',
+            name='size',
+            field=models.IntegerField(default=0),
+        ),
+    ]
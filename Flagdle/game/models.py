@@ -118,33 +118,56 @@ class DjangoSession(models.Model):
         db_table = 'django_session'
 
 
-class BestScore(models.Model):
-    username = models.CharField(unique=True, max_length=150)
-    afrique_best_score = models.IntegerField(default=0)
-    amerique_best_score = models.IntegerField(default=0)
-    asie_best_score = models.IntegerField(default=0)
-    europe_best_score = models.IntegerField(default=0)
-    moyen_orient_best_score = models.IntegerField(default=0)
-    oceanie_best_score = models.IntegerField(default=0)
-    world_best_score = models.IntegerField(default=0)
-    pride_best_score = models.IntegerField(default=0)
+class Score(models.Model):
+    username = models.CharField(max_length=150)
+    category = models.CharField(max_length=50)
+    current_score = models.IntegerField(default=0)
+    best_score = models.IntegerField(default=0)
 
     class Meta:
         managed = True
-        db_table = 'best_score_user'
+        db_table = 'score_user'
+        unique_together = (('username', 'category'),)
 
 
-class CurrentScore(models.Model):
+class TotalScore(models.Model):
+    # Sum of the best scores of a user, kept up to date by game.scores to sort the leaderboard with an index
     username = models.CharField(unique=True, max_length=150)
-    afrique_current_score = models.IntegerField(default=0)
-    amerique_current_score = models.IntegerField(default=0)
-    asie_current_score = models.IntegerField(default=0)
-    europe_current_score = models.IntegerField(default=0)
-    moyen_orient_current_score = models.IntegerField(default=0)
-    oceanie_current_score = models.IntegerField(default=0)
-    world_current_score = models.IntegerField(default=0)
-    pride_current_score = models.IntegerField(default=0)
+    total_best_score = models.IntegerField(default=0)
+
+    class Meta:
+        managed = True
+        db_table = 'total_score_user'
+        indexes = [
+            models.Index(fields=['-total_best_score', 'username'], name='total_score_ranking_idx'),
+        ]
+
+
+class GameProgress(models.Model):
+    # Deck dealt to a user in a category in token mode and their position in it, see game.game_state.TokenGameState:
+    # a token is only accepted at this seed and cursor, so each one earns a point at most once
+    username = models.CharField(max_length=150)
+    category = models.CharField(max_length=50)
+    seed = models.BigIntegerField()
+    size = models.IntegerField(default=0)
+    cursor = models.IntegerField()
+
+    class Meta:
+        managed = True
+        db_table = 'game_progress'
+        unique_together = (('username', 'category'),)
+
+
+class GuessEvent(models.Model):
+    # One row per guess, only ever inserted in batches by game.guess_log, for analytics
+    username = models.CharField(max_length=150)
+    category = models.CharField(max_length=50)
+    image = models.CharField(max_length=255)
+    correct = models.BooleanField()
+    # Time between the image being shown and the guess, measured by the browser, None without JavaScript
+    latency_ms = models.PositiveIntegerField(blank=True, null=True)
+    created_at = models.DateTimeField()
 
     class Meta:
         managed = True
-        db_table = 'current_score_user'
+        db_table = 'guess_event'
@@ -0,0 +1,147 @@
+import logging
+import threading
+
+from asgiref.sync import sync_to_async
+from django.db import DatabaseError, connections
+from sortedcontainers import SortedList
+
+from .models import TotalScore
+
+logger = logging.getLogger(__name__)
+
+
+class Ranking:
+    """
+    Order-statistics index of the total best scores, kept in memory by each worker.\n
+    Users are sorted like the leaderboard: by total best score, then by username.
+    rank_of, top and around run in O(log n) (plus the size of the result).\n
+    The index is loaded once when the worker starts (see start), then only updated with the best scores raised
+    by this worker, so workers see each other's progress after a restart.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._totals = None
+        self._sorted = None
+        self.loads = 0  # number of loads started, see increment
+
+    def load(self):
+        """
+        Rebuilds the index from the total_score_user table.
+        """
+        # The table is read under the lock, so a point scored meanwhile waits for the new index instead of being lost
+        with self._lock:
+            self.loads += 1
+            totals = dict(TotalScore.objects.values_list('username', 'total_best_score'))
+            self._sorted = SortedList((-total, username) for username, total in totals.items())
+            self._totals = totals
+
+    def start(self):
+        """
+        Loads the index when the worker starts, called by the WSGI and ASGI entry points
+        so the first leaderboard request does not wait for the whole table.
+        """
+        try:
+            self._ensure_loaded()
+        except DatabaseError:
+            # E.g. the database is not migrated yet, the first leaderboard request tries again
+            logger.exception('Could not load the leaderboard ranking')
+        finally:
+            connections.close_all()
+
+    def _ensure_loaded(self):
+        if self._totals is None:
+            with self._lock:
+                if self._totals is None:
+                    self.load()
+
+    async def aensure_loaded(self):
+        """
+        Loads the index from async code, where the other methods can not read the database.
+        """
+        if self._totals is None:
+            await sync_to_async(self._ensure_loaded)()
+
+    def clear(self):
+        with self._lock:
+            self._totals = None
+            self._sorted = None
+
+    def increment(self, username, amount=1, since=None):
+        """
+        Adds points to the total of a user, does nothing until the index is loaded
+        since the database already has them.\n
+        since is the value of loads read before the points were written: when the index was loaded after it,
+        the load may or may not have read them, so the total of the user is read from the database instead.
+        """
+        with self._lock:
+            if self._totals is None:
+                return
+            if since is not None and since != self.loads:
+                total = TotalScore.objects.filter(username=username).values_list('total_best_score', flat=True).first()
+                self._set(username, total or 0)
+                return
+            self._set(username, self._totals.get(username, 0) + amount)
+
+    def set(self, username, total):
+        """
+        Replaces the total of a user, does nothing until the index is loaded.
+        """
+        with self._lock:
+            if self._totals is None:
+                return
+            self._set(username, total)
+
+    def _set(self, username, total):
+        previous = self._totals.get(username)
+        if previous is not None:
+            self._sorted.remove((-previous, username))
+        self._totals[username] = total
+        self._sorted.add((-total, username))
+
+    def __len__(self):
+        self._ensure_loaded()
+        return len(self._sorted)
+
+    def rank_of(self, username):
+        """
+        Returns the 1-based rank of a user, or None if they have no score.
+        """
+        self._ensure_loaded()
+        with self._lock:
+            total = self._totals.get(username)
+            if total is None:
+                return None
+            return self._sorted.index((-total, username)) + 1
+
+    def position_after(self, total, username):
+        """
+        Returns the offset of the first user ranked after (total, username), used to resolve leaderboard cursors.
+        """
+        self._ensure_loaded()
+        with self._lock:
+            return self._sorted.bisect_right((-total, username))
+
+    def top(self, k, offset=0):
+        """
+        Returns the (rank, username, total) of k users starting at offset.
+        """
+        self._ensure_loaded()
+        with self._lock:
+            return [
+                (rank, username, -total)
+                for rank, (total, username) in enumerate(self._sorted.islice(offset, offset + k), start=offset + 1)
+            ]
+
+    def around(self, username, k):
+        """
+        Returns the (rank, username, total) of a user and of the k users ranked above and below them.
+        """
+        rank = self.rank_of(username)
+        if rank is None:
+            return []
+        offset = max(rank - 1 - k, 0)
+        return self.top(rank + k - offset, offset)
+
+
+ranking = Ranking()
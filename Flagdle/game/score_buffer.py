@@ -0,0 +1,157 @@
+import atexit
+import logging
+import threading
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from django.db.models.functions import Greatest
+
+from .db import FlushThread
+from .models import Score, TotalScore
+from .ranking import ranking
+
+logger = logging.getLogger(__name__)
+
+
+class ScoreBuffer:
+    """
+    Per-worker buffer of the points scored by correct guesses.\n
+    Points are counted in memory per (user, category) and written in one transaction every SCORE_BUFFER_FLUSH_MS
+    milliseconds, or as soon as SCORE_BUFFER_FLUSH_EVENTS points are waiting, by a background thread.
+    Points still waiting are written when the worker exits.\n
+    Scores read through get include the points of this worker that are not written yet.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # One flush at a time, so points put back after a failure are not written by a concurrent flush
+        self._flush_lock = threading.Lock()
+        self._pending = {}  # (username, category) -> [current score, best score, points] read before the first point
+        self._flushing = {}  # the entries being written by flush
+        self._flushes = 0  # flushes written, the scores read from the database before one are out of date
+        self._events = 0
+        self._thread = FlushThread(
+            'score-write-behind', lambda: self.flush(raise_errors=False), lambda: settings.SCORE_BUFFER_FLUSH_MS / 1000,
+        )
+
+    def get(self, username, category):
+        """
+        Returns the (current score, best score) of a user in a category with the points waiting, or None.
+        """
+        with self._lock:
+            entry = self._pending.get((username, category)) or self._flushing.get((username, category))
+            return None if entry is None else self._merge(entry)
+
+    @staticmethod
+    def _merge(entry):
+        current_score, best_score, points = entry
+        return current_score + points, max(best_score, current_score + points)
+
+    def increment(self, username, category):
+        """
+        Adds a point to the current score of a user in a category.\n
+        Returns True if the best score is raised.
+        """
+        key = (username, category)
+        scores = flushes = None
+        while True:
+            with self._lock:
+                entry = self._pending.get(key)
+                if entry is None:
+                    # Points being written are not in the database yet
+                    flushing = self._flushing.get(key)
+                    if flushing is not None:
+                        entry = self._pending[key] = [*self._merge(flushing), 0]
+                    elif scores is not None and flushes == self._flushes:
+                        entry = self._pending[key] = [*scores, 0]
+                if entry is not None:
+                    current_score, best_score = self._merge(entry)
+                    entry[2] += 1
+                    self._events += 1
+                    if self._events >= settings.SCORE_BUFFER_FLUSH_EVENTS:
+                        self._thread.wake()
+                    break
+                flushes = self._flushes
+            # The scores are read once, further points of the same player only touch memory.
+            # Read again if a flush wrote points of the player in the meantime
+            scores = Score.objects.filter(username=username, category=category).values_list(
+                'current_score', 'best_score'
+            ).first() or (0, 0)
+        self._thread.start()
+        return current_score + 1 > best_score
+
+    def flush(self, raise_errors=True, username=None):
+        """
+        Writes the waiting points in a single transaction, then updates the totals and the ranking of their users.\n
+        If username is given, only the points of this user are written.
+        """
+        with self._flush_lock:
+            with self._lock:
+                if username is None:
+                    pending = self._flushing = self._pending
+                    self._pending = {}
+                    self._events = 0
+                else:
+                    pending = self._flushing = {key: entry for key, entry in self._pending.items() if key[0] == username}
+                    for key, (_, _, points) in pending.items():
+                        del self._pending[key]
+                        self._events -= points
+            if not pending:
+                return
+
+            try:
+                with transaction.atomic():
+                    for (username, category), (_, _, points) in pending.items():
+                        _add_points(username, category, points)
+
+                    usernames = {username for username, category in pending}
+                    totals = dict(
+                        Score.objects.filter(username__in=usernames).values('username').annotate(
+                            total=Sum('best_score'),
+                        ).values_list('username', 'total')
+                    )
+                    TotalScore.objects.bulk_create(
+                        [TotalScore(username=username, total_best_score=total) for username, total in totals.items()],
+                        update_conflicts=True,
+                        unique_fields=['username'],
+                        update_fields=['total_best_score'],
+                    )
+            except Exception:
+                # Put the points back, they are retried on the next flush
+                with self._lock:
+                    for key, (current_score, best_score, points) in pending.items():
+                        entry = self._pending.setdefault(key, [current_score, best_score, 0])
+                        entry[0], entry[1] = current_score, best_score
+                        entry[2] += points
+                        self._events += points
+                    self._flushing = {}
+                if raise_errors:
+                    raise
+                logger.exception('Could not write the buffered scores to the database')
+                return
+
+            with self._lock:
+                self._flushing = {}
+                self._flushes += 1
+        for username, total in totals.items():
+            ranking.set(username, total)
+
+
+def _add_points(username, category, points):
+    scores = Score.objects.filter(username=username, category=category)
+    if scores.update(
+        current_score=F('current_score') + points,
+        best_score=Greatest('best_score', F('current_score') + points),
+    ):
+        return
+    try:
+        with transaction.atomic():
+            Score.objects.create(username=username, category=category, current_score=points, best_score=points)
+    except IntegrityError:
+        # The row was created by another worker
+        _add_points(username, category, points)
+
+
+score_buffer = ScoreBuffer()
+atexit.register(score_buffer.flush, raise_errors=False)
@@ -0,0 +1,246 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+
+from .db import aretry_on_busy, retry_on_busy
+from .models import Score, TotalScore
+from .ranking import ranking
+from .score_buffer import score_buffer
+
+CATEGORIES = ['Afrique', 'Amerique', 'Asie', 'Europe', 'Moyen-Orient', 'Oceanie', 'World', 'Pride']
+
+
+def get_score(username, category):
+    """
+    Returns the (current score, best score) of a user in a category.
+    """
+    if settings.SCORE_BUFFER:
+        buffered = score_buffer.get(username, category)
+        if buffered is not None:
+            return buffered
+    score = Score.objects.filter(username=username, category=category).values_list('current_score', 'best_score').first()
+    return score or (0, 0)
+
+
+async def aget_score(username, category):
+    """
+    Async version of get_score.
+    """
+    if settings.SCORE_BUFFER:
+        buffered = score_buffer.get(username, category)
+        if buffered is not None:
+            return buffered
+    score = await Score.objects.filter(username=username, category=category).values_list(
+        'current_score', 'best_score'
+    ).afirst()
+    return score or (0, 0)
+
+
+def increment_score(username, category):
+    """
+    Adds a point to the current score of a user in a category, raising the best score if it is beaten.\n
+    Both scores are updated by the database so concurrent guesses never lose a point,
+    in the same transaction as the total of the user so it never drifts from the sum of the best scores.\n
+    With settings.SCORE_BUFFER the point is written later in a batch, see game.score_buffer.\n
+    Returns True if the best score was raised.
+    """
+    if settings.SCORE_BUFFER:
+        return score_buffer.increment(username, category)
+    return _increment_scores(username, category)
+
+
+@retry_on_busy
+def _increment_scores(username, category):
+    # Read before the write, so a ranking loaded in between does not count the point twice
+    loads = ranking.loads
+    # A "database is locked" error rolls back both writes, the whole transaction is retried
+    with transaction.atomic():
+        best_score_raised = _increment_score(username, category)
+        if best_score_raised:
+            _increment_total_score(username)
+    if best_score_raised:
+        ranking.increment(username, since=loads)
+    return best_score_raised
+
+
+def _increment_score(username, category):
+    scores = Score.objects.filter(username=username, category=category)
+
+    # best_score >= current_score always holds, so the best score is beaten only when both are equal
+    if scores.filter(best_score__lte=F('current_score')).update(
+        current_score=F('current_score') + 1,
+        best_score=F('current_score') + 1,
+    ):
+        return True
+    if scores.update(current_score=F('current_score') + 1):
+        return False
+
+    try:
+        with transaction.atomic():
+            Score.objects.create(username=username, category=category, current_score=1, best_score=1)
+    except IntegrityError:
+        # The row was created by a concurrent guess
+        return _increment_score(username, category)
+    return True
+
+
+async def aincrement_score(username, category):
+    """
+    Async version of increment_score.
+    """
+    if settings.SCORE_BUFFER:
+        # The first point of a player reads the scores from the database
+        return await sync_to_async(score_buffer.increment)(username, category)
+    # The score and the total are written in one transaction, which async queries can not open
+    return await sync_to_async(_increment_scores)(username, category)
+
+
+def _increment_total_score(username):
+    if TotalScore.objects.filter(username=username).update(total_best_score=F('total_best_score') + 1):
+        return
+    try:
+        with transaction.atomic():
+            TotalScore.objects.create(username=username, total_best_score=1)
+    except IntegrityError:
+        _increment_total_score(username)
+
+
+@retry_on_busy
+def reset_current_scores(username):
+    """
+    Resets the current score of a user in every category.
+    """
+    if settings.SCORE_BUFFER:
+        # The points scored before the reset must not be added after it
+        score_buffer.flush(username=username)
+    Score.objects.filter(username=username).update(current_score=0)
+
+
+@aretry_on_busy
+async def areset_current_scores(username):
+    """
+    Async version of reset_current_scores.
+    """
+    if settings.SCORE_BUFFER:
+        await sync_to_async(score_buffer.flush)(username=username)
+    await Score.objects.filter(username=username).aupdate(current_score=0)
+
+
+def get_leaderboard(offset=0, limit=50, after=None):
+    """
+    Returns a page of the leaderboard, sorted by total best score then username.\n
+    after is the (total best score, username) of the last row of the previous page, it replaces the offset
+    so deep pages are read from the index instead of skipping rows.\n
+    Each row is a dict with the username, total and average best score and best score per category.
+    """
+    leaderboard = list(_leaderboard_page(offset, limit, after))
+    return _add_best_scores(leaderboard, get_best_scores([row['username'] for row in leaderboard]))
+
+
+async def aget_leaderboard(offset=0, limit=50, after=None):
+    """
+    Async version of get_leaderboard.
+    """
+    leaderboard = [row async for row in _leaderboard_page(offset, limit, after)]
+    return _add_best_scores(leaderboard, await aget_best_scores([row['username'] for row in leaderboard]))
+
+
+def _leaderboard_page(offset, limit, after):
+    totals = TotalScore.objects.order_by('-total_best_score', 'username')
+
+    if after is not None:
+        total_best_score, username = after
+        totals = totals.filter(
+            Q(total_best_score__lt=total_best_score) | Q(total_best_score=total_best_score, username__gt=username)
+        )
+        offset = 0
+
+    totals = totals.values('username', 'total_best_score')
+    return totals[offset:offset + limit]
+
+
+def _add_best_scores(leaderboard, scores):
+    for row in leaderboard:
+        row['average_best_score'] = average_best_score(row['total_best_score'])
+        row['scores'] = scores[row['username']]
+    return leaderboard
+
+
+def get_ranked_leaderboard(offset=0, limit=50, after=None):
+    """
+    Same as get_leaderboard, but the order and the totals come from the in-memory ranking
+    so only the best scores of the page are read from the database.\n
+    Rows also have the rank of the user.
+    """
+    page = _ranking_page(offset, limit, after)
+    return _ranked_rows(page, get_best_scores([username for rank, username, total in page]))
+
+
+async def aget_ranked_leaderboard(offset=0, limit=50, after=None):
+    """
+    Async version of get_ranked_leaderboard.
+    """
+    await ranking.aensure_loaded()
+    page = _ranking_page(offset, limit, after)
+    return _ranked_rows(page, await aget_best_scores([username for rank, username, total in page]))
+
+
+def _ranking_page(offset, limit, after):
+    if after is not None:
+        offset = ranking.position_after(*after)
+    return ranking.top(limit, offset)
+
+
+def _ranked_rows(page, scores):
+    return [
+        {
+            'rank': rank,
+            'username': username,
+            'total_best_score': total,
+            'average_best_score': average_best_score(total),
+            'scores': scores[username],
+        }
+        for rank, username, total in page
+    ]
+
+
+def average_best_score(total_best_score):
+    """
+    Returns the best score per category of a total, rounded half to even, for both leaderboards.
+    """
+    return round(total_best_score / len(CATEGORIES))
+
+
+def get_best_scores(usernames):
+    """
+    Returns the best score per category of each user, in a single query.
+    """
+    scores = {username: dict.fromkeys(CATEGORIES, 0) for username in usernames}
+    for username, category, best_score in _best_scores_rows(scores):
+        scores[username][category] = best_score
+    return _add_buffered_scores(scores)
+
+
+async def aget_best_scores(usernames):
+    """
+    Async version of get_best_scores.
+    """
+    scores = {username: dict.fromkeys(CATEGORIES, 0) for username in usernames}
+    async for username, category, best_score in _best_scores_rows(scores):
+        scores[username][category] = best_score
+    return _add_buffered_scores(scores)
+
+
+def _best_scores_rows(scores):
+    return Score.objects.filter(username__in=list(scores)).values_list('username', 'category', 'best_score')
+
+
+def _add_buffered_scores(scores):
+    if settings.SCORE_BUFFER:
+        for username in scores:
+            for category in CATEGORIES:
+                buffered = score_buffer.get(username, category)
+                if buffered is not None:
+                    scores[username][category] = buffered[1]
+    return scores
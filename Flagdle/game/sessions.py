@@ -0,0 +1,227 @@
+import atexit
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.sessions.backends.base import CreateError, UpdateError
+from django.contrib.sessions.backends.db import SessionStore as DBSessionStore
+from django.db import DatabaseError, IntegrityError, router, transaction
+from django.utils import timezone
+
+from .db import FlushThread
+
+
+class SessionBuffer:
+    """
+    Per-worker cache of the sessions in front of the django_session table.\n
+    The last SESSION_LRU_SIZE sessions used are kept in memory, loading one only reads its expire_date from the table,
+    to notice the sessions another worker changed or deleted, instead of the whole row.
+    Saved sessions are kept pending and written in one batch every SESSION_FLUSH_INTERVAL seconds by a background thread,
+    which also deletes the expired rows of the table, SESSION_PURGE_BATCH_SIZE at a time.
+    The batch only updates the rows still in the table, so a session deleted by any worker stays deleted.
+    Pending sessions are written when the worker exits.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Held while writing to the table, so a deleted session can not be written back by a flush in progress
+        self._flush_lock = threading.Lock()
+        self._sessions = OrderedDict()  # session_key -> (session_data, expire_date)
+        self._pending = {}  # session_key -> (session_data, expire_date), not written yet
+        self._flushing = {}  # the sessions being written by flush
+        self._thread = FlushThread('session-write-behind', self._write_behind, lambda: settings.SESSION_FLUSH_INTERVAL)
+        self._last_purge = time.monotonic()
+
+    def get(self, session_key):
+        """
+        Returns the (session_data, expire_date) of a session, or None if it is not cached
+        or its row was changed or deleted since it was cached.
+        """
+        with self._lock:
+            cached = self._pending.get(session_key)
+            if cached is None:
+                # Being written, the table may not have it yet
+                cached = self._flushing.get(session_key)
+            written = cached is None
+            if written:
+                cached = self._sessions.get(session_key)
+        if cached is None:
+            return None
+
+        # Changes of this worker not written yet are newer than the row, the others are checked against it
+        if written and self._expire_date(session_key) != cached[1]:
+            with self._lock:
+                if self._sessions.get(session_key) is cached:
+                    del self._sessions[session_key]
+            return None
+
+        with self._lock:
+            self._sessions[session_key] = cached
+            self._sessions.move_to_end(session_key)
+            self._evict()
+        return cached
+
+    @staticmethod
+    def _expire_date(session_key):
+        # Saving a session always moves its expire_date, which makes it the version of the row
+        from django.contrib.sessions.models import Session
+
+        return Session.objects.filter(session_key=session_key).values_list('expire_date', flat=True).first()
+
+    def put(self, session_key, session_data, expire_date, pending=False):
+        with self._lock:
+            self._sessions[session_key] = (session_data, expire_date)
+            self._sessions.move_to_end(session_key)
+            self._evict()
+            if pending:
+                self._pending[session_key] = (session_data, expire_date)
+        if pending:
+            self._thread.start()
+
+    def _evict(self):
+        # Pending sessions stay readable from self._pending until they are written
+        while len(self._sessions) > settings.SESSION_LRU_SIZE:
+            self._sessions.popitem(last=False)
+
+    def delete(self, session_key):
+        """
+        Forgets a session and deletes its row right away.
+        """
+        from django.contrib.sessions.models import Session
+
+        with self._flush_lock:
+            with self._lock:
+                self._sessions.pop(session_key, None)
+                self._pending.pop(session_key, None)
+                self._flushing.pop(session_key, None)
+            Session.objects.filter(session_key=session_key).delete()
+
+    def flush(self):
+        """
+        Writes the pending sessions in a single transaction.\n
+        Only the rows still in the table are updated: sessions are inserted when they are created,
+        a missing row was deleted, by this worker or another one, and must not be written back.
+        """
+        from django.contrib.sessions.models import Session
+
+        with self._flush_lock:
+            with self._lock:
+                pending = self._flushing = self._pending
+                self._pending = {}
+            if not pending:
+                return
+
+            sessions = [
+                Session(session_key=session_key, session_data=session_data, expire_date=expire_date)
+                for session_key, (session_data, expire_date) in pending.items()
+            ]
+            using = router.db_for_write(Session)
+            try:
+                with transaction.atomic(using=using):
+                    Session.objects.using(using).bulk_update(sessions, ['session_data', 'expire_date'])
+            except DatabaseError:
+                # Put the sessions back unless they were saved again in the meantime, they are retried on the next flush
+                with self._lock:
+                    for session_key, session in pending.items():
+                        self._pending.setdefault(session_key, session)
+                    self._flushing = {}
+                raise
+            with self._lock:
+                self._flushing = {}
+
+    def purge_expired(self):
+        """
+        Deletes the expired sessions, in short transactions of SESSION_PURGE_BATCH_SIZE rows
+        so that the guesses waiting for the database are not blocked for long.
+        """
+        from django.contrib.sessions.models import Session
+
+        now = timezone.now()
+        with self._lock:
+            for session_key in [key for key, (_, expire_date) in self._sessions.items() if expire_date <= now]:
+                del self._sessions[session_key]
+
+        batch_size = settings.SESSION_PURGE_BATCH_SIZE
+        while True:
+            session_keys = list(
+                Session.objects.filter(expire_date__lt=now).values_list('session_key', flat=True)[:batch_size]
+            )
+            if session_keys:
+                Session.objects.filter(session_key__in=session_keys, expire_date__lt=now).delete()
+            if len(session_keys) < batch_size:
+                return
+
+    def _write_behind(self):
+        self.flush()
+        if time.monotonic() - self._last_purge >= settings.SESSION_PURGE_INTERVAL:
+            self._last_purge = time.monotonic()
+            self.purge_expired()
+
+
+session_buffer = SessionBuffer()
+atexit.register(session_buffer.flush)
+
+
+class SessionStore(DBSessionStore):
+    """
+    Database session store read through the per-worker SessionBuffer.\n
+    With SESSION_DURABILITY = 'write-behind' changes to a session are written in batches,
+    the last SESSION_FLUSH_INTERVAL seconds of changes are lost if the worker is killed.
+    With 'write-through' every change is written right away and the buffer only saves the reads.\n
+    New sessions and deletions (login, logout) are always written right away.
+    The buffer is not shared between workers: a worker notices the sessions changed or deleted by the others
+    when it loads them, but changes not written yet are only seen by the worker that made them.
+    """
+
+    def load(self):
+        cached = session_buffer.get(self.session_key) if self.session_key else None
+        if cached is None:
+            s = self._get_session_from_db()
+            if s is None:
+                return {}
+            session_buffer.put(s.session_key, s.session_data, s.expire_date)
+            return self.decode(s.session_data)
+
+        session_data, expire_date = cached
+        if expire_date <= timezone.now():
+            self._session_key = None
+            return {}
+        return self.decode(session_data)
+
+    def exists(self, session_key):
+        return session_buffer.get(session_key) is not None or super().exists(session_key)
+
+    def save(self, must_create=False):
+        if self.session_key is None:
+            return self.create()
+        data = self._get_session(no_load=must_create)
+        obj = self.create_model_instance(data)
+
+        write_behind = not must_create and settings.SESSION_DURABILITY == 'write-behind'
+        if not write_behind:
+            # New sessions are inserted right away so that the database still rejects duplicate keys
+            using = router.db_for_write(self.model, instance=obj)
+            try:
+                with transaction.atomic(using=using):
+                    obj.save(force_insert=must_create, force_update=not must_create, using=using)
+            except IntegrityError:
+                if must_create:
+                    raise CreateError
+                raise
+            except DatabaseError:
+                if not must_create:
+                    raise UpdateError
+                raise
+        session_buffer.put(obj.session_key, obj.session_data, obj.expire_date, pending=write_behind)
+
+    def delete(self, session_key=None):
+        if session_key is None:
+            if self.session_key is None:
+                return
+            session_key = self.session_key
+        session_buffer.delete(session_key)
+
+    @classmethod
+    def clear_expired(cls):
+        session_buffer.purge_expired()
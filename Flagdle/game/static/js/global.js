@@ -55,6 +55,141 @@ function resetScore() {
     }
 }
 
+// Function to submit guesses without reloading the game page, only does something on game.html
+function addGuessFormListener() {
+    const guessForm = document.getElementById('guess-form');
+    if (!guessForm) {
+        return;
+    }
+
+    // Time the player took to answer, sent with the guess for the guess log
+    let imageShownAt = performance.now();
+
+    guessForm.addEventListener('submit', async function (event) {
+        event.preventDefault();
+        guessForm.elements['latency_ms'].value = Math.round(performance.now() - imageShownAt);
+
+        // The game and the category are in the query string of the game page
+        const response = await fetch(guessForm.dataset.guessUrl + window.location.search, {
+            method: 'POST',
+            body: new FormData(guessForm),
+        });
+        if (!response.ok) {
+            // Fall back to the regular form submission
+            guessForm.submit();
+            return;
+        }
+        const data = await response.json();
+
+        const messageElement = document.getElementById('message');
+        messageElement.textContent = data.message;
+        messageElement.hidden = false;
+        messageElement.classList.toggle('success', data.correct);
+        messageElement.classList.toggle('error', !data.correct);
+
+        if (data.game_state) {
+            guessForm.elements['game_state'].value = data.game_state;
+        }
+        document.getElementById('current-score').textContent = data.current_score;
+        document.getElementById('best-score').textContent = data.best_score;
+
+        const image = document.getElementById('game-image');
+        if (data.all_guessed) {
+            guessForm.hidden = true;
+            image.closest('.image-game').hidden = true;
+            document.getElementById('victory-message').hidden = false;
+            return;
+        }
+
+        // Replace the variants of the previous image, the browser picks the copy matching the displayed size
+        const picture = image.parentElement;
+        picture.querySelectorAll('source').forEach(source => source.remove());
+        for (const source of data.next_image.sources) {
+            const sourceElement = document.createElement('source');
+            sourceElement.type = source.type;
+            sourceElement.srcset = source.srcset;
+            sourceElement.sizes = image.sizes;
+            picture.insertBefore(sourceElement, image);
+        }
+        image.src = data.next_image.url;
+        imageShownAt = performance.now();
+        preloadImages(data.preload, image.sizes);
+        guessForm.elements['current_image'].value = data.next_image.path;
+        guessForm.elements['guess'].value = '';
+        guessForm.elements['guess'].focus();
+    });
+}
+
+// Append the next page of the gallery when the "More" link comes into view
+function addGalleryScrollListener() {
+    const moreLink = document.getElementById('gallery-more');
+    if (!moreLink || !('IntersectionObserver' in window)) {
+        return;
+    }
+    const gallery = document.getElementById('gallery');
+    let loading = false;
+
+    const observer = new IntersectionObserver(async function (entries) {
+        if (loading || !entries.some(entry => entry.isIntersecting)) {
+            return;
+        }
+        loading = true;
+        const response = await fetch(moreLink.dataset.fragmentUrl + '&page=' + moreLink.dataset.nextPage);
+        if (response.ok) {
+            const data = await response.json();
+            gallery.insertAdjacentHTML('beforeend', data.html);
+            if (data.next_page) {
+                moreLink.dataset.nextPage = data.next_page;
+                moreLink.href = moreLink.href.replace(/page=\d+/, 'page=' + data.next_page);
+            } else {
+                observer.disconnect();
+                moreLink.remove();
+            }
+        }
+        loading = false;
+    }, { rootMargin: '500px' });
+    observer.observe(moreLink);
+}
+
+// Replace a thumbnail of the gallery atlas by its full size image when clicked
+function addSpriteClickListener() {
+    const gallery = document.getElementById('gallery');
+    if (!gallery) {
+        return;
+    }
+    gallery.addEventListener('click', function (event) {
+        const sprite = event.target.closest('.sprite');
+        if (!sprite) {
+            return;
+        }
+        event.preventDefault();
+        const image = document.createElement('img');
+        image.src = sprite.href;
+        image.alt = sprite.getAttribute('aria-label');
+        sprite.replaceWith(image);
+    });
+}
+
+// Download the next images of the deck in the background, picking the same copy as the game image will.
+// The game page asks for its first ones in its Link header, browsers ignore that header on fetch responses
+function preloadImages(images, sizes) {
+    for (const nextImage of images || []) {
+        const picture = document.createElement('picture');
+        for (const source of nextImage.sources) {
+            const sourceElement = document.createElement('source');
+            sourceElement.type = source.type;
+            sourceElement.srcset = source.srcset;
+            sourceElement.sizes = sizes;
+            picture.appendChild(sourceElement);
+        }
+        // Inside the picture before it gets a src, otherwise it downloads the fallback and then the chosen source
+        const img = document.createElement('img');
+        picture.appendChild(img);
+        img.sizes = sizes;
+        img.src = nextImage.url;
+    }
+}
+
 // Function to add event listeners to theme icons
 function addThemeEventListeners() {
     const moonIcon = document.querySelector('#moon-icon');
@@ -94,6 +229,15 @@ window.onload = function () {
     // Reset score (conditional call)
     resetScore();
 
+    // Guesses are sent to the JSON guess endpoint on the game page
+    addGuessFormListener();
+
+    // The next images of the galleries are loaded while scrolling
+    addGalleryScrollListener();
+
+    // Thumbnails of the galleries are replaced by the full size image on click
+    addSpriteClickListener();
+
     // $('img').mousedown(function (e) {
     //     if (e.button == 2) { // right click
     //         return false; // do nothing!
@@ -0,0 +1,59 @@
+import hashlib
+import os
+import re
+import threading
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.utils.functional import cached_property
+
+# name.0123456789ab.ext, the names given to the files by collectstatic
+HASHED_NAME = re.compile(r'\.([0-9a-f]{12})\.[^./]+$')
+
+
+class AssetManifestStorage(ManifestStaticFilesStorage):
+    """
+    Stores the collected static files under names containing the md5 of their content,
+    so their URL changes when they change and they can be cached forever.\n
+    Files that are not collected yet (development, tests) keep their own name instead of raising an error.
+    """
+    manifest_strict = False
+
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            return name
+
+    @cached_property
+    def hashed_names(self):
+        return set(self.hashed_files.values())
+
+    def content_hash(self, name):
+        """
+        Returns the md5 in the name of a collected file, or None if name is not a hashed name.
+        """
+        match = HASHED_NAME.search(name)
+        return match.group(1) if match and name in self.hashed_names else None
+
+
+_etags = {}
+_etags_lock = threading.Lock()
+
+
+def file_etag(path):
+    """
+    Returns the strong ETag of a file, the md5 of its content.\n
+    The md5 is computed once per version of the file (mtime and size).
+    """
+    stat = os.stat(path)
+    key = (path, stat.st_mtime_ns, stat.st_size)
+    etag = _etags.get(key)
+    if etag is None:
+        hasher = hashlib.md5()
+        with open(path, 'rb') as file:
+            for chunk in iter(lambda: file.read(64 * 1024), b''):
+                hasher.update(chunk)
+        etag = f'"{hasher.hexdigest()}"'
+        with _etags_lock:
+            _etags[key] = etag
+    return etag
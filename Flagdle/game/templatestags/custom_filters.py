@@ -1,8 +1,64 @@
 # game/templatetags/custom_filters.py
 from django import template
+from django.templatetags.static import static
+from django.utils.html import format_html, format_html_join
+
+from ..catalog import image_sources
 
 register = template.Library()
 
 @register.filter
 def get_item(dictionary, key):
     return dictionary.get(key)
+
+
+@register.simple_tag
+def picture(image, sizes, lazy=False, **attributes):
+    """
+    Renders an image of the catalog as a <picture> offering its variants in every format,
+    so the browser downloads the smallest copy matching the displayed size.\n
+    sizes is the displayed width of the image, the other keyword arguments are attributes of the <img>.
+    lazy images are only downloaded when they get close to the viewport, their placeholder is shown until then.
+    """
+    if lazy:
+        attributes.update(loading='lazy', decoding='async')
+        if image.width and image.height:
+            # Reserve the space of the image before it is loaded
+            attributes.update(width=image.width, height=image.height)
+        if image.placeholder:
+            attributes['style'] = f'background: url({image.placeholder}) center / cover no-repeat'
+    sources = format_html_join(
+        '', '<source type="{}" srcset="{}" sizes="{}">',
+        (
+            (mime_type, ', '.join(f'{static(path)} {width}w' for path, width in candidates), sizes)
+            for mime_type, candidates in image_sources(image)
+        ),
+    )
+    alt = attributes.pop('alt', image.answer)
+    img_attributes = format_html_join('', ' {}="{}"', attributes.items())
+    return format_html(
+        '<picture>{}<img src="{}" alt="{}" sizes="{}"{}></picture>', sources, static(image.path), alt, sizes, img_attributes,
+    )
+
+
+@register.simple_tag
+def sprite(image, atlas):
+    """
+    Renders the thumbnail of an image from the atlas of its category, as a link to the full size image.\n
+    The atlas is the --atlas background of the gallery. Images missing from the atlas are rendered as a lazy <picture>.
+    """
+    tile = atlas['images'].get(image.path)
+    if tile is None:
+        return picture(image, '150px', lazy=True)
+
+    # Percentages keep the thumbnail in place whatever the displayed size of the link
+    x, y, width, height = tile
+    position_x = x * 100 / (atlas['width'] - width) if atlas['width'] != width else 0
+    position_y = y * 100 / (atlas['height'] - height) if atlas['height'] != height else 0
+    style = (
+        f'aspect-ratio: {width} / {height}; background-size: {atlas["width"] * 100 / width:g}% auto; '
+        f'background-position: {position_x:g}% {position_y:g}%'
+    )
+    return format_html(
+        '<a class="sprite" href="{}" role="img" aria-label="{}" style="{}"></a>', static(image.path), image.answer, style,
+    )
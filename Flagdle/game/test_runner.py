@@ -0,0 +1,17 @@
+import os
+import tempfile
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+
+
+class TestRunner(DiscoverRunner):
+    """
+    Test runner of the project, set as settings.TEST_RUNNER.\n
+    The metrics of the test requests go to a temporary METRICS_DATABASE for the whole run, including the ones
+    written when the process exits, never to the file of the project.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        settings.METRICS_DATABASE = os.path.join(tempfile.gettempdir(), 'flagdle_test_metrics.sqlite3')
@@ -1,3 +1,607 @@
-from django.test import TestCase
+import re
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.core import signing
+from django.core.cache import caches
+from django.db import OperationalError, connection
+from django.db.models import F, QuerySet
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.html import escape
+
+from .catalog import asset_catalog
+from .guess_log import GuessLog, guess_log
+from .models import GameProgress, GuessEvent, Score, TotalScore
+from .ranking import ranking
+from .score_buffer import ScoreBuffer
+from .scores import CATEGORIES, get_leaderboard, get_ranked_leaderboard, reset_current_scores
+from .sessions import SessionBuffer, SessionStore
+
+CURRENT_IMAGE = re.compile(r'name="current_image" value="([^"]+)"')
+GAME_STATE = re.compile(r'name="game_state" value="([^"]*)"')
+
+
+@override_settings(
+    SESSION_ENGINE='django.contrib.sessions.backends.db',
+    GAME_STATE='session',
+    SCORE_BUFFER=False,
+    # The guesses are written by a background thread, outside the request
+    GUESS_LOG=False,
+    LEADERBOARD_RANKING=True,
+)
+class QueryBudgetTestCase(TestCase):
+    """
+    Pins the maximum number of SQL queries and session writes of each URL for a given scenario,
+    so an N+1 or an extra get_or_create fails the tests instead of slowing production down.\n
+    When a change needs more queries on purpose, raise the budget in the same commit.
+    """
+
+    def setUp(self):
+        ranking.clear()
+        caches['default'].clear()
+        caches['pages'].clear()
+        self.user = User.objects.create_user('player', password='secret-password')
+        self.client.force_login(self.user)
+
+    def assertBudget(self, queries, session_writes, method, path, data=None, status=200, **extra):
+        """
+        Requests path with self.client.<method>, checks the status and that the request ran
+        at most queries SQL queries, of which at most session_writes wrote the session.
+        """
+        with CaptureQueriesContext(connection) as captured:
+            if data is None:
+                response = getattr(self.client, method)(path, **extra)
+            else:
+                response = getattr(self.client, method)(path, data, **extra)
+        self.assertEqual(response.status_code, status)
+
+        # The savepoints are opened by the transaction of TestCase around the atomic blocks, not by the views
+        sql = [query['sql'] for query in captured if 'SAVEPOINT' not in query['sql']]
+        writes = [query for query in sql if 'django_session' in query and query.startswith(('INSERT', 'UPDATE'))]
+        listing = '\n'.join(sql)
+        self.assertLessEqual(len(sql), queries, f'{method.upper()} {path} ran {len(sql)} queries:\n{listing}')
+        self.assertLessEqual(
+            len(writes), session_writes, f'{method.upper()} {path} wrote the session {len(writes)} times:\n{listing}',
+        )
+        return response
+
+    def game_url(self, name='game', game='flag', category='Pride'):
+        return f'{reverse(name)}?game={game}&category={category}'
+
+    def current_image(self, response):
+        return CURRENT_IMAGE.search(response.content.decode()).group(1)
+
+    def answer(self, image, directory='flags', category='Pride'):
+        return asset_catalog.find(directory, category, image).answer
+
+
+class AccountQueryBudgetTests(QueryBudgetTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.logout()
+
+    def test_signup_page(self):
+        self.assertBudget(0, 0, 'get', reverse('signup'))
+
+    def test_signup(self):
+        self.assertBudget(8, 2, 'post', reverse('signup'), {
+            'username': 'newcomer', 'email': 'newcomer@example.com',
+            'password1': 'a-long-password', 'password2': 'a-long-password',
+        }, status=302)
+
+    def test_login_page(self):
+        self.assertBudget(0, 0, 'get', reverse('login'))
+
+    def test_login(self):
+        self.assertBudget(
+            5, 2, 'post', reverse('login'), {'username': 'player', 'password': 'secret-password'}, status=302,
+        )
+
+    def test_logout(self):
+        self.client.force_login(self.user)
+        self.assertBudget(4, 0, 'post', reverse('logout'), status=302)
+
+
+class PageQueryBudgetTests(QueryBudgetTestCase):
+
+    def test_homepage(self):
+        self.assertBudget(2, 0, 'get', reverse('home'))
+
+    def test_homepage_after_playing(self):
+        # The decks of the categories played are cleared
+        self.client.get(f"{reverse('game')}?game=flag&category=Pride")
+        self.assertBudget(3, 1, 'get', reverse('home'))
+
+    def test_country_gallery(self):
+        self.assertBudget(2, 0, 'get', f"{reverse('countries')}?category=Europe")
+        # The images are served from the page cache
+        self.assertBudget(2, 0, 'get', f"{reverse('countries')}?category=Europe")
+
+    def test_country_gallery_fragment(self):
+        self.assertBudget(2, 0, 'get', f"{reverse('countries_fragment')}?category=Europe&page=2")
+
+    def rendered_fragment(self, query, name='countries'):
+        templates = [template.name for template in self.client.get(f"{reverse(name)}?{query}").templates]
+        return 'gallery_items.html' in templates
+
+    def test_gallery_cache_key(self):
+        self.client.get(f"{reverse('countries')}?category=Europe")
+        # Unknown parameters and pages past the end are served the cached fragments
+        for query in ('category=Europe&x=1', 'category=Europe&page=1&utm_source=y', 'category=Europe&page=-3'):
+            self.assertFalse(self.rendered_fragment(query), query)
+        self.client.get(f"{reverse('countries')}?category=Europe&page=2")
+        self.assertFalse(self.rendered_fragment('category=Europe&page=999'))
+        # The page and its fragment view share the entry
+        self.assertFalse(self.rendered_fragment('category=Europe&page=2', 'countries_fragment'))
+
+    def test_gallery_cache_shared_between_users(self):
+        self.client.get(f"{reverse('countries')}?category=Europe")
+        other = User.objects.create_user('other', password='secret-password')
+        self.client.force_login(other)
+        response = self.client.get(f"{reverse('countries')}?category=Europe")
+        self.assertNotIn('gallery_items.html', [template.name for template in response.templates])
+        self.assertContains(response, '<span>other</span>')
+        self.assertNotContains(response, '<span>player</span>')
+
+    def test_flag_gallery(self):
+        self.assertBudget(2, 0, 'get', f"{reverse('flags')}?category=World")
+
+    def test_flag_gallery_fragment(self):
+        self.assertBudget(2, 0, 'get', f"{reverse('flags_fragment')}?category=World&page=2")
+
+    def test_static_file(self):
+        self.assertBudget(0, 0, 'get', reverse('static', args=['country/country_icon.webp']))
+
+    def test_metrics(self):
+        self.assertBudget(0, 0, 'get', reverse('metrics'))
+
+    def test_admin(self):
+        self.user.is_staff = self.user.is_superuser = True
+        self.user.save()
+        self.assertBudget(3, 0, 'get', reverse('admin:index'))
+
+
+class GameQueryBudgetTests(QueryBudgetTestCase):
+
+    def test_game_page(self):
+        self.assertBudget(4, 1, 'get', self.game_url())
+
+    def test_correct_guess(self):
+        image = self.current_image(self.client.get(self.game_url()))
+        # First point of the player: both score rows are created
+        self.assertBudget(
+            9, 1, 'post', self.game_url(), {'current_image': image, 'guess': self.answer(image)},
+        )
+        self.assertEqual(Score.objects.get(username='player', category='Pride').current_score, 1)
+
+    def test_correct_guess_with_existing_score(self):
+        Score.objects.create(username='player', category='Pride', current_score=3, best_score=5)
+        TotalScore.objects.create(username='player', total_best_score=5)
+        image = self.current_image(self.client.get(self.game_url()))
+        self.assertBudget(
+            6, 1, 'post', self.game_url(), {'current_image': image, 'guess': self.answer(image)},
+        )
+
+    def test_answer_not_in_page(self):
+        page = self.client.get(self.game_url()).content.decode()
+        answer = self.answer(CURRENT_IMAGE.search(page).group(1))
+        self.assertNotIn(answer, page)
+        self.assertNotIn(escape(answer), page)
+        self.assertNotIn('correct_answer', page)
+
+    def test_incorrect_guess(self):
+        image = self.current_image(self.client.get(self.game_url()))
+        self.assertBudget(4, 1, 'post', self.game_url(), {'current_image': image, 'guess': 'Atlantis'})
+        self.assertFalse(Score.objects.filter(username='player').exists())
+
+    def test_guess_endpoint_correct(self):
+        image = self.current_image(self.client.get(self.game_url()))
+        self.assertBudget(
+            9, 1, 'post', self.game_url('guess'), {'current_image': image, 'guess': self.answer(image)},
+        )
+
+    def test_guess_endpoint_incorrect(self):
+        image = self.current_image(self.client.get(self.game_url()))
+        self.assertBudget(4, 1, 'post', self.game_url('guess'), {'current_image': image, 'guess': 'Atlantis'})
+
+    def test_guess_sent_again(self):
+        image = self.current_image(self.client.get(self.game_url()))
+        data = {'current_image': image, 'guess': self.answer(image)}
+        self.assertEqual(self.client.post(self.game_url('guess'), data).json()['score_increment'], 1)
+        # The image is no longer at the cursor of the deck
+        answer = self.client.post(self.game_url('guess'), data).json()
+        self.assertEqual((answer['correct'], answer['score_increment'], answer['current_score']), (True, 0, 1))
+
+    @override_settings(GAME_STATE='token')
+    def test_guess_endpoint_token_mode(self):
+        page = self.client.get(self.game_url()).content.decode()
+        image = CURRENT_IMAGE.search(page).group(1)
+        game_state = GAME_STATE.search(page).group(1)
+        # The signed game state replaces the session: no session read nor write.
+        # The guess moves the cursor of the deck in game_progress
+        self.assertBudget(7, 0, 'post', self.game_url('guess'), {
+            'current_image': image, 'guess': self.answer(image), 'game_state': game_state,
+        })
+
+    @override_settings(GAME_STATE='token')
+    def test_token_replay(self):
+        page = self.client.get(self.game_url()).content.decode()
+        image = CURRENT_IMAGE.search(page).group(1)
+        first = {'current_image': image, 'guess': self.answer(image), 'game_state': GAME_STATE.search(page).group(1)}
+        answer = self.client.post(self.game_url('guess'), first).json()
+        image = answer['next_image']['path']
+        second = {'current_image': image, 'guess': self.answer(image), 'game_state': answer['game_state']}
+        self.assertEqual(self.client.post(self.game_url('guess'), second).json()['current_score'], 2)
+
+        # Sent again, even after logging out, neither token scores
+        self.client.logout()
+        for data in (first, second, first, second):
+            self.assertEqual(self.client.post(self.game_url('guess'), data).json()['score_increment'], 0)
+        self.assertEqual(Score.objects.get(username='player', category='Pride').current_score, 2)
+
+    @override_settings(GAME_STATE='token')
+    def test_token_replay_new_deck(self):
+        def deal():
+            page = self.client.get(self.game_url()).content.decode()
+            image = CURRENT_IMAGE.search(page).group(1)
+            return {'current_image': image, 'guess': self.answer(image), 'game_state': GAME_STATE.search(page).group(1)}
+
+        def seed(data):
+            return signing.loads(data['game_state'], salt='game.game_state')[2][0]
+
+        first = deal()
+        # The game page continues the deck in progress
+        self.assertEqual(seed(deal()), seed(first))
+        # The home page starts a new one
+        self.client.get(reverse('home'))
+        second = deal()
+        self.assertNotEqual(seed(second), seed(first))
+        self.assertEqual(GameProgress.objects.get(username='player', category='Pride').seed, seed(second))
+
+        # Only the deck dealt last scores, once: a guess never deals the deck it is scored on
+        answers = [self.client.post(self.game_url('guess'), data).json() for data in (first, second, first, second)]
+        self.assertEqual([answer['score_increment'] for answer in answers], [0, 1, 0, 0])
+        self.assertEqual(Score.objects.get(username='player', category='Pride').current_score, 1)
+
+    @override_settings(GUESS_LOG=True)
+    def test_guess_log(self):
+        image = self.current_image(self.client.get(self.game_url()))
+        # Queued in memory, the request runs no extra query
+        self.assertBudget(4, 1, 'post', self.game_url('guess'), {
+            'current_image': image, 'guess': 'Atlantis', 'latency_ms': 1500,
+        })
+        guess_log.flush()
+        event = GuessEvent.objects.get()
+        self.assertEqual(
+            (event.username, event.category, event.image, event.correct, event.latency_ms),
+            ('player', 'Pride', image, False, 1500),
+        )
+
+    @override_settings(GUESS_LOG=True)
+    def test_guess_log_skips_unknown_images(self):
+        self.client.get(self.game_url())
+        self.client.post(self.game_url('guess'), {'current_image': 'x' * 1000, 'guess': 'x'})
+        guess_log.flush()
+        self.assertFalse(GuessEvent.objects.exists())
+
+    def test_reset_current_score(self):
+        Score.objects.create(username='player', category='Pride', current_score=3, best_score=5)
+        self.assertBudget(3, 0, 'post', reverse('reset_current_score'))
+
+
+class LeaderboardQueryBudgetTests(QueryBudgetTestCase):
+    users = 10000
+
+    @classmethod
+    def setUpTestData(cls):
+        TotalScore.objects.bulk_create(
+            [TotalScore(username=f'user{i:05}', total_best_score=i % 500) for i in range(cls.users)],
+            batch_size=1000,
+        )
+        Score.objects.bulk_create(
+            [
+                Score(username=f'user{i:05}', category=category, current_score=0, best_score=i % 500 // len(CATEGORIES))
+                for i in range(cls.users) for category in CATEGORIES[:2]
+            ],
+            batch_size=1000,
+        )
+
+    def test_leaderboard(self):
+        # Reads the ranking, then the best scores of the page
+        self.assertBudget(4, 0, 'get', reverse('leaderboard'))
+        self.assertBudget(3, 0, 'get', reverse('leaderboard'))
+
+    def test_leaderboard_deep_page(self):
+        self.client.get(reverse('leaderboard'))
+        self.assertBudget(3, 0, 'get', f"{reverse('leaderboard')}?page=150&after=100:user04000")
+
+    @override_settings(LEADERBOARD_RANKING=False)
+    def test_leaderboard_without_ranking(self):
+        self.assertBudget(4, 0, 'get', reverse('leaderboard'))
+        self.assertBudget(4, 0, 'get', f"{reverse('leaderboard')}?page=150&after=100:user04000")
+
+    def test_ranking_reload(self):
+        ranking.load()
+        # Raised by another worker
+        TotalScore.objects.filter(username='user00000').update(total_best_score=1000)
+        self.assertNotEqual(ranking.top(1)[0][1], 'user00000')
+        ranking.load()
+        self.assertEqual(ranking.top(1), [(1, 'user00000', 1000)])
+
+    def test_point_scored_during_load(self):
+        ranking.load()
+        loads = ranking.loads
+        values_list = TotalScore.objects.values_list
+
+        def score_while_loading(*args, **kwargs):
+            # Written before the table is read, added to the ranking after it
+            TotalScore.objects.filter(username='user00001').update(total_best_score=F('total_best_score') + 1000)
+            return values_list(*args, **kwargs)
+
+        with mock.patch.object(TotalScore.objects, 'values_list', side_effect=score_while_loading):
+            ranking.load()
+        ranking.increment('user00001', 1000, since=loads)
+        self.assertEqual(ranking.top(1), [(1, 'user00001', 1001)])
+
+    def test_average_best_score(self):
+        # Totals ending in .5 per category are rounded the same way by both leaderboards
+        ranked = {row['username']: row['average_best_score'] for row in get_ranked_leaderboard(0, 500)}
+        for row in get_leaderboard(0, 500):
+            self.assertEqual(row['average_best_score'], ranked[row['username']], row)
+
+
+# The background threads of the buffers wait for an hour, the tests flush them
+@override_settings(
+    SESSION_ENGINE='game.sessions',
+    SESSION_DURABILITY='write-behind',
+    SESSION_FLUSH_INTERVAL=3600,
+    SESSION_LRU_SIZE=2,
+)
+class SessionBufferTests(TestCase):
+
+    def setUp(self):
+        self.buffer = SessionBuffer()
+        patcher = mock.patch('game.sessions.session_buffer', self.buffer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def create_session(self, **data):
+        session = SessionStore()
+        session.update(data)
+        session.create()
+        return session
+
+    def row(self, session_key):
+        session = Session.objects.filter(session_key=session_key).first()
+        return session and SessionStore().decode(session.session_data)
+
+    def test_new_session_written_right_away(self):
+        session = self.create_session(deck=1)
+        self.assertEqual(self.row(session.session_key), {'deck': 1})
+
+    def test_read_pending_session(self):
+        session = self.create_session(deck=1)
+        session['deck'] = 2
+        session.save()
+        self.assertEqual(self.row(session.session_key), {'deck': 1})
+        # Evicted from the LRU by other sessions, still read from the pending ones
+        self.create_session()
+        self.create_session()
+        with self.assertNumQueries(0):
+            self.assertEqual(SessionStore(session.session_key)['deck'], 2)
+
+        self.buffer.flush()
+        self.assertEqual(self.row(session.session_key), {'deck': 2})
+
+    def test_read_flushing_session(self):
+        session = self.create_session(deck=1)
+        session['deck'] = 2
+        session.save()
+        self.create_session()
+        self.create_session()
+        read = []
+        bulk_update = QuerySet.bulk_update
+
+        def read_while_flushing(*args, **kwargs):
+            read.append(SessionStore(session.session_key)['deck'])
+            return bulk_update(*args, **kwargs)
+
+        # The flush writes through Session.objects.using()
+        with mock.patch.object(QuerySet, 'bulk_update', autospec=True, side_effect=read_while_flushing):
+            self.buffer.flush()
+        self.assertEqual(read, [2])
+
+    def test_failed_flush_retried(self):
+        session = self.create_session(deck=1)
+        session['deck'] = 2
+        session.save()
+        with mock.patch.object(QuerySet, 'bulk_update', side_effect=OperationalError('database is locked')):
+            with self.assertRaises(OperationalError):
+                self.buffer.flush()
+        self.assertEqual(SessionStore(session.session_key)['deck'], 2)
+
+        self.buffer.flush()
+        self.assertEqual(self.row(session.session_key), {'deck': 2})
+
+    def test_deleted_session_not_written_back(self):
+        session = self.create_session(deck=1)
+        session['deck'] = 2
+        session.save()
+        session.delete()
+        self.buffer.flush()
+        self.assertIsNone(self.row(session.session_key))
+        self.assertEqual(SessionStore(session.session_key).load(), {})
+
+    def test_session_changed_by_another_worker(self):
+        session = self.create_session(deck=1)
+        self.assertEqual(SessionStore(session.session_key)['deck'], 1)
+        other = SessionBuffer()
+        with mock.patch('game.sessions.session_buffer', other):
+            session = SessionStore(session.session_key)
+            session['deck'] = 2
+            session.save()
+            other.flush()
+        # The cached copy is older than the row
+        self.assertEqual(SessionStore(session.session_key)['deck'], 2)
+
+    def test_session_deleted_by_another_worker(self):
+        session = self.create_session(deck=1)
+        other = SessionBuffer()
+        with mock.patch('game.sessions.session_buffer', other):
+            pending = SessionStore(session.session_key)
+            pending['deck'] = 2
+            pending.save()
+        # Logged out on this worker while the other one still has the session pending
+        self.assertEqual(SessionStore(session.session_key)['deck'], 1)
+        SessionStore(session.session_key).delete()
+        other.flush()
+        self.assertIsNone(self.row(session.session_key))
+        with mock.patch('game.sessions.session_buffer', other):
+            self.assertEqual(SessionStore(session.session_key).load(), {})
+
+    @override_settings(SESSION_PURGE_BATCH_SIZE=2)
+    def test_purge_expired(self):
+        now = timezone.now()
+        Session.objects.bulk_create([
+            Session(session_key=f'expired{i}', session_data='', expire_date=now - timedelta(days=1)) for i in range(5)
+        ])
+        session = self.create_session(deck=1)
+        self.buffer.purge_expired()
+        self.assertEqual(list(Session.objects.values_list('session_key', flat=True)), [session.session_key])
+
+
+@override_settings(SCORE_BUFFER=True, SCORE_BUFFER_FLUSH_MS=3600 * 1000, SCORE_BUFFER_FLUSH_EVENTS=1000)
+class ScoreBufferTests(TestCase):
+
+    def setUp(self):
+        self.buffer = ScoreBuffer()
+        Score.objects.create(username='player', category='Pride', current_score=3, best_score=5)
+        Score.objects.create(username='player', category='World', current_score=0, best_score=10)
+        TotalScore.objects.create(username='player', total_best_score=15)
+
+    def increment(self, points, category='Pride'):
+        return [self.buffer.increment('player', category) for _ in range(points)]
+
+    def scores(self, category='Pride'):
+        return Score.objects.filter(username='player', category=category).values_list(
+            'current_score', 'best_score',
+        ).get()
+
+    def test_read_pending_points(self):
+        # 4, 5 then 6 beats the best score
+        self.assertEqual(self.increment(3), [False, False, True])
+        self.assertEqual(self.buffer.get('player', 'Pride'), (6, 6))
+        self.assertEqual(self.scores(), (3, 5))
+
+    def test_flush(self):
+        self.increment(4)
+        self.increment(2, 'Asie')
+        self.buffer.flush()
+        self.assertIsNone(self.buffer.get('player', 'Pride'))
+        self.assertEqual(self.scores(), (7, 7))
+        self.assertEqual(self.scores('Asie'), (2, 2))
+        self.assertEqual(TotalScore.objects.get(username='player').total_best_score, 7 + 10 + 2)
+
+    def test_read_flushing_points(self):
+        self.increment(4)
+        read = []
+
+        def read_while_flushing(*args, **kwargs):
+            read.append(self.buffer.get('player', 'Pride'))
+            # Points scored during the flush start from the points being written
+            self.buffer.increment('player', 'Pride')
+            return original(*args, **kwargs)
+
+        original = TotalScore.objects.bulk_create
+        with mock.patch.object(TotalScore.objects, 'bulk_create', side_effect=read_while_flushing):
+            self.buffer.flush()
+        self.assertEqual(read, [(7, 7)])
+        self.assertEqual(self.buffer.get('player', 'Pride'), (8, 8))
+
+        self.buffer.flush()
+        self.assertEqual(self.scores(), (8, 8))
+        self.assertEqual(TotalScore.objects.get(username='player').total_best_score, 18)
+
+    def test_failed_flush_retried_once(self):
+        self.increment(4)
+        locked = OperationalError('database is locked')
+        with mock.patch.object(TotalScore.objects, 'bulk_create', side_effect=locked):
+            with self.assertRaises(OperationalError):
+                self.buffer.flush()
+        # Rolled back and put back, the points are neither lost nor counted twice
+        self.assertEqual(self.scores(), (3, 5))
+        self.assertEqual(self.buffer.get('player', 'Pride'), (7, 7))
+        self.increment(1)
+
+        self.buffer.flush()
+        self.assertEqual(self.scores(), (8, 8))
+        self.assertEqual(TotalScore.objects.get(username='player').total_best_score, 18)
+
+    def test_flush_while_reading_scores(self):
+        first = QuerySet.first
+        calls = []
+
+        def flush_while_reading(queryset):
+            scores = first(queryset)
+            if not calls:
+                calls.append(scores)
+                # Another guess of the player scores and is written before this one counts its point
+                self.buffer.increment('player', 'Pride')
+                self.buffer.flush()
+            return scores
+
+        with mock.patch.object(QuerySet, 'first', autospec=True, side_effect=flush_while_reading):
+            self.assertEqual(self.increment(1), [False])
+        self.assertEqual(self.buffer.get('player', 'Pride'), (5, 5))
+        self.buffer.flush()
+        self.assertEqual(self.scores(), (5, 5))
+
+    @override_settings(SCORE_BUFFER=True)
+    def test_reset_flushes_the_user_only(self):
+        with mock.patch('game.scores.score_buffer', self.buffer):
+            self.increment(2)
+            self.buffer.increment('other', 'Pride')
+            reset_current_scores('player')
+        self.assertEqual(self.scores(), (0, 5))
+        self.assertEqual(self.buffer.get('other', 'Pride'), (1, 1))
+        self.assertFalse(Score.objects.filter(username='other').exists())
+        # Written inside the test, not by the thread of the buffer once it is over
+        self.buffer.flush()
+
+
+
+@override_settings(GUESS_LOG_FLUSH_INTERVAL=3600, GUESS_LOG_BATCH_SIZE=1000, GUESS_LOG_MAX_PENDING=5)
+class GuessLogTests(TestCase):
+
+    def setUp(self):
+        self.log = GuessLog()
+
+    def record(self, count):
+        for i in range(count):
+            self.log.record('player', 'Pride', f'flags/Pride/{i}.webp', True, 1000)
+
+    def test_queue_capped(self):
+        self.record(8)
+        self.log.flush()
+        self.assertEqual(GuessEvent.objects.count(), 5)
+
+    @override_settings(GUESS_LOG_MAX_RETRIES=2)
+    def test_failing_guesses_dropped(self):
+        self.record(3)
+        locked = OperationalError('database is locked')
+        with mock.patch.object(GuessEvent.objects, 'bulk_create', side_effect=locked):
+            # Retried once, then dropped
+            self.log.flush(raise_errors=False)
+            self.assertEqual(len(self.log._pending), 3)
+            self.log.flush(raise_errors=False)
+        self.assertEqual(self.log._pending, [])
+
+        self.record(1)
+        self.log.flush()
+        self.assertEqual(GuessEvent.objects.count(), 1)
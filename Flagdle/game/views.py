@@ -1,20 +1,72 @@
+import hashlib
+import logging
 import os
-import random
 
+from django.conf import settings
 from django.contrib.auth import login
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.http import JsonResponse
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.cache import caches
+from django.core.exceptions import PermissionDenied, SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse
+from django.template.loader import render_to_string
+from django.templatetags.static import static
 from django.urls import reverse_lazy
+from django.utils._os import safe_join
+from django.utils.safestring import mark_safe
+from django.utils.cache import get_conditional_response
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_safe
 from django.views.generic import CreateView, TemplateView, FormView
-from unidecode import unidecode
 
+from .catalog import asset_catalog, image_sources, normalize_answer
+from .deck import Deck, new_seed
 from .forms import GuessForm, SignUpForm
-from .models import BestScore, CurrentScore
-from .Base32EncoderDecoder import base32_to_utf8
-
-BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-ASSETS_DIR = os.path.join(BASE_DIR, 'assets')
+from .game_state import get_game_state
+from .guess_log import guess_log
+from .metrics import metrics_store
+from .ranking import ranking
+from .scores import (
+    CATEGORIES, get_leaderboard, get_ranked_leaderboard, increment_score, reset_current_scores,
+)
+from .storage import file_etag
+
+logger = logging.getLogger(__name__)
+
+
+# Displayed width of the game image, the sizes of its srcset
+GAME_IMAGE_SIZES = '35vh'
+
+
+def image_json(image):
+    """
+    Returns the URLs of a catalog image for the game script.
+    """
+    return {
+        'path': image.path,
+        'url': static(image.path),
+        'sources': [
+            {'type': mime_type, 'srcset': ', '.join(f'{static(path)} {width}w' for path, width in candidates)}
+            for mime_type, candidates in image_sources(image)
+        ],
+    }
+
+
+def preload_link(image):
+    """
+    Returns the Link header value asking the browser to download a game image in advance.\n
+    When the image has variants only the best format is preloaded, browsers that do not support it skip the hint.
+    """
+    sources = image_sources(image)
+    if not sources:
+        return f'<{static(image.path)}>; rel=preload; as=image'
+    mime_type, candidates = sources[0]
+    srcset = ', '.join(f'{static(path)} {width}w' for path, width in candidates)
+    return (
+        f'<{static(candidates[-1][0])}>; rel=preload; as=image; type="{mime_type}"; '
+        f'imagesrcset="{srcset}"; imagesizes="{GAME_IMAGE_SIZES}"'
+    )
 
 
 class SignUpView(CreateView):
@@ -35,61 +87,140 @@ class HomeView(TemplateView):
         context = super().get_context_data(**kwargs)
         context['categories'] = ['Afrique', 'Amerique', 'Asie', 'Europe', 'Moyen-Orient', 'Oceanie']
         context['flag_categories'] = ['World', 'Pride']
-        self.request.session['guesses'] = []
-        # reset the shown images in the session
-        for category in context['categories']:
-            self.request.session[f'shown_images_{category}'] = []
-        for category in context['flag_categories']:
-            self.request.session[f'shown_images_{category}'] = []
+        # start a new deck in every category
+        get_game_state(self.request).clear_decks(context['categories'] + context['flag_categories'])
         
         return context
 
 
-def get_from_directory(directory, subdirectory):
-    directory_path = os.path.join(ASSETS_DIR, directory, subdirectory)
-    images = []
-    if os.path.exists(directory_path):
-        for filename in os.listdir(directory_path):
-            if filename.endswith(('.png', '.jpg', '.jpeg', '.gif', '.webp')) and 'icon' not in filename:
-                filename_without_extension = os.path.splitext(filename)[0]
-                images.append((os.path.join(ASSETS_DIR, directory, subdirectory, filename), filename_without_extension))
-    return images
-
+class CatalogFragmentCacheMixin:
+    """
+    Caches the rendered images and pagination of a page of a category of the asset catalog
+    in the settings.PAGE_CACHE cache.\n
+    The fragment does not depend on the user, so one entry serves every player,
+    the rest of the page, whose header shows their name, is rendered around it on each request.
+    The key holds the catalog version of the category, so the fragment is rendered again as soon as its images change.
+    Only the values that change the fragment are in the key, other query parameters do not add entries.
+    """
+    directory = ''
+    categories = []
+    items_template_name = 'gallery_items.html'
+    pagination_template_name = 'gallery_pagination.html'
+
+    def get_selected_category(self):
+        return self.request.GET.get('category', self.categories[0])
+
+    def get_cache_variant(self):
+        """
+        Returns what changes the fragment besides the directory and the category, e.g. the page number.
+        """
+        return ''
+
+    def render_fragment(self, context):
+        """
+        Returns the (items, pagination) HTML of the page described by context, from the cache if it has them.
+        """
+        category = self.get_selected_category()
+        version = asset_catalog.version(self.directory, category)
+        if version is not None:
+            fragment = hashlib.md5(
+                f'{self.directory}:{category}:{self.get_cache_variant()}'.encode('utf-8')
+            ).hexdigest()
+            key = f'fragment:{fragment}:{version}'
+            page_cache = caches[settings.PAGE_CACHE]
+            cached = page_cache.get(key)
+            if cached is not None:
+                return cached
+
+        # Rendered without the request, nothing of the user can end up in the cache
+        rendered = (
+            mark_safe(render_to_string(self.items_template_name, context)),
+            mark_safe(render_to_string(self.pagination_template_name, context)),
+        )
+        if version is not None:
+            page_cache.set(key, rendered)
+        return rendered
+
+
+class GalleryView(CatalogFragmentCacheMixin, TemplateView):
+    """
+    Images of a category of the asset catalog, settings.GALLERY_PAGE_SIZE at a time.\n
+    The page shows the first images, the next ones are appended from the fragment view while scrolling.
+    """
+    fragment_url = ''  # name of the URL of the fragment view of the gallery
+    item_class = ''  # CSS class of an image of the gallery
+
+    def get_page(self):
+        """
+        Returns the page number asked for, between 1 and the last page of the category.
+        """
+        try:
+            page = int(self.request.GET.get('page', 1))
+        except ValueError:
+            return 1
+        images = asset_catalog.get(self.directory, self.get_selected_category())
+        last_page = max((len(images) + settings.GALLERY_PAGE_SIZE - 1) // settings.GALLERY_PAGE_SIZE, 1)
+        return min(max(page, 1), last_page)
 
-class ImagesView(TemplateView):
-    template_name = 'images.html'
+    def get_cache_variant(self):
+        return self.get_page()
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        categories_image = ['Afrique', 'Amerique', 'Asie', 'Europe', 'Moyen-Orient', 'Oceanie']
-        selected_category = self.request.GET.get('category', categories_image[0])
-        images = get_from_directory("country", selected_category)
-
-        # Transform filenames
-        transformed_images = [(image, base32_to_utf8(filename)) for image, filename in images]
-
-        context['images'] = transformed_images
-        context['categories'] = categories_image
+        selected_category = self.get_selected_category()
+        images = asset_catalog.get(self.directory, selected_category)
+
+        page = self.get_page()
+        start = (page - 1) * settings.GALLERY_PAGE_SIZE
+        context['images'] = images[start:start + settings.GALLERY_PAGE_SIZE]
+        if start + settings.GALLERY_PAGE_SIZE < len(images):
+            context['next_page'] = page + 1
+        if page > 1:
+            context['previous_page'] = page - 1
+
+        context['atlas'] = asset_catalog.atlas(self.directory, selected_category)
+        context['categories'] = self.categories
         context['selected_category'] = selected_category
+        context['fragment_url'] = self.fragment_url
+        context['item_class'] = self.item_class
+        context['gallery_items'], context['gallery_pagination'] = self.render_fragment(context)
         return context
 
 
-class FlagView(TemplateView):
-    template_name = 'flags.html'
+class GalleryFragmentMixin:
+    """
+    Answers a page of a gallery as JSON: the HTML of its images and the number of the next page.
+    """
 
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        categories_image = ['World', 'Pride']
-        selected_category = self.request.GET.get('category', categories_image[0])
-        images = get_from_directory("flags", selected_category)
+    def render_to_response(self, context, **response_kwargs):
+        return JsonResponse({
+            'html': context['gallery_items'],
+            'next_page': context.get('next_page'),
+        })
 
-        # Transform filenames
-        transformed_images = [(image, base32_to_utf8(filename)) for image, filename in images]
 
-        context['images'] = transformed_images
-        context['categories'] = categories_image
-        context['selected_category'] = selected_category
-        return context
+class ImagesView(GalleryView):
+    template_name = 'images.html'
+    directory = 'country'
+    categories = ['Afrique', 'Amerique', 'Asie', 'Europe', 'Moyen-Orient', 'Oceanie']
+    fragment_url = 'countries_fragment'
+    item_class = 'image-container'
+
+
+class ImagesFragmentView(GalleryFragmentMixin, ImagesView):
+    pass
+
+
+class FlagView(GalleryView):
+    template_name = 'flags.html'
+    directory = 'flags'
+    categories = ['World', 'Pride']
+    fragment_url = 'flags_fragment'
+    item_class = 'flag-item'
+
+
+class FlagFragmentView(GalleryFragmentMixin, FlagView):
+    pass
 
 
 class GameView(LoginRequiredMixin, FormView):
@@ -98,9 +229,12 @@ class GameView(LoginRequiredMixin, FormView):
     form_class = GuessForm
     success_url = reverse_lazy('game')
 
+    def setup(self, request, *args, **kwargs):
+        super().setup(request, *args, **kwargs)
+        self.game_state = get_game_state(request)
+
     def get_game_settings(self):
         game = self.request.GET.get('game')
-        print(game)
         if game == 'country':
             categories = ['Afrique', 'Amerique', 'Asie', 'Europe', 'Moyen-Orient', 'Oceanie']
             directory = 'country'
@@ -112,143 +246,194 @@ class GameView(LoginRequiredMixin, FormView):
             directory = ''
         return game, categories, directory
 
+    def get_selected_category(self, categories):
+        return self.request.GET.get('category', categories[0] if categories else '')
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         game, categories, directory = self.get_game_settings()
-        print(game, categories, directory)
-        selected_category = self.request.GET.get('category', categories[0] if categories else '')
-
-        images = get_from_directory(directory, selected_category)
+        logger.debug('Game %s, categories %s, directory %s', game, categories, directory)
+        selected_category = self.get_selected_category(categories)
 
-        # Transform filenames
-        transformed_images = [(image, base32_to_utf8(filename)) for image, filename in images]
+        images = asset_catalog.get(directory, selected_category)
 
-        if not transformed_images:
+        if not images:
             context['message'] = 'No images found in this category.'
         else:
             context['categories'] = categories
             context['selected_category'] = selected_category
 
-            # Get already shown images from the session
-            shown_images = self.request.session.get(f'shown_images_{selected_category}', [])
-            remaining_images = [img for img in transformed_images if img[0] not in shown_images]
-
-            if not remaining_images:
+            next_image = self.pick_image(images, selected_category)
+            if next_image is None:
                 context['message'] = 'Congratulations! You have guessed all the images in this category.'
                 context['all_guessed'] = True
-                self.request.session[f'shown_images_{selected_category}'] = []
             else:
-                context['images'] = remaining_images
-                random_image = random.choice(remaining_images)
-                context['current_image'] = random_image[0]
-                context['correct_answer'] = random_image[1]
+                context['current_image'] = next_image.path
+                context['current_entry'] = next_image
+                context['upcoming_images'] = self.get_upcoming_images(images, selected_category)
                 context['all_guessed'] = False
 
         # Add the scores to the context
-        username = self.request.user
-
-        best_score, best_created = BestScore.objects.get_or_create(username=username)
-        current_score, current_created = CurrentScore.objects.get_or_create(username=username)
-        score_field_prefix = selected_category.lower().replace('-', '_')
-
-        context['current_score'] = getattr(current_score, f"{score_field_prefix}_current_score", 0)
-        context['best_score'] = getattr(best_score, f"{score_field_prefix}_best_score", 0)
+        context['current_score'], context['best_score'] = self.get_scores(selected_category)
         context['game'] = game
+        context['game_image_sizes'] = GAME_IMAGE_SIZES
+        context['game_state_token'] = self.game_state.dumps()
         return context
 
-    def form_valid(self, form):
-        user_guess = form.cleaned_data['guess'].strip().lower()
-        user_guess = unidecode(user_guess).replace('-', ' ')
-        
-        correct_answer = form.cleaned_data['correct_answer'].strip().lower()
-        correct_answer_without_extension = os.path.splitext(correct_answer)[0]
-        correct_answer_without_extension = unidecode(correct_answer_without_extension).replace('-', ' ')
-
-        if user_guess == correct_answer_without_extension:
+    def get_scores(self, category):
+        return self.game_state.get_scores(category)
+
+    def get_deck(self, category, size):
+        """
+        Returns the [seed, size, cursor] of the player's run in a category, dealing a new deck if needed.
+        """
+        deck = self.game_state.get_deck(category)
+        # The deck of a run is dealt again if images were added to or removed from the category
+        if not deck or deck[1] != size:
+            deck = [new_seed(), size, 0]
+            self.game_state.set_deck(category, deck)
+        return deck
+
+    def pick_image(self, images, category):
+        """
+        Returns the image at the cursor of the player's deck.\n
+        Returns None and starts the category over once every image has been dealt.
+        """
+        seed, size, cursor = self.get_deck(category, len(images))
+        if cursor >= size:
+            self.game_state.clear_deck(category)
+            return None
+        return images[Deck(seed, size)[cursor]]
+
+    def get_upcoming_images(self, images, category):
+        """
+        Returns the next settings.PRELOAD_IMAGES images of the player's deck, after the current one.
+        """
+        seed, size, cursor = self.get_deck(category, len(images))
+        deck = Deck(seed, size)
+        return [images[deck[position]] for position in range(cursor + 1, min(cursor + 1 + settings.PRELOAD_IMAGES, size))]
+
+    def check_guess(self, form, directory, category):
+        """
+        Compares the guess with the answer of the current image, updates the score and moves the deck to the next image.\n
+        Returns (correct, message, scored), scored is True when the guess earned a point.
+        """
+        correct, message, scored = self.judge_guess(form, directory, category)
+        if scored:
+            best_score_raised = increment_score(self.game_state.username, category)
+            self.game_state.add_point(category, best_score_raised)
+        return correct, message, scored
+
+    def judge_guess(self, form, directory, category):
+        """
+        Compares the guess with the answer of the current image, queues it in the guess log
+        and moves the deck to the next image.\n
+        Returns (correct, message, scored), scored is True when the guess earns a point.
+        """
+        user_guess = normalize_answer(form.cleaned_data['guess'])
+
+        images = asset_catalog.get(directory, category)
+        image_index = asset_catalog.index_of(directory, category, form.cleaned_data['current_image'])
+        if image_index is None:
+            # The answer is never sent to the page, an image missing from the catalog can not be checked,
+            # e.g. one of a page left open while the images of the category changed
+            return False, "This image is no longer part of the game.", False
+
+        correct_answer = images[image_index].normalized_answer
+        correct = user_guess == correct_answer
+        if settings.GUESS_LOG:
+            guess_log.record(
+                self.game_state.username, category, images[image_index].path, correct, form.cleaned_data['latency_ms'],
+            )
+        if correct:
             message = "Correct!"
-            score_increment = 1
         else:
-            message = f"Incorrect. The correct answer was {correct_answer_without_extension}."
-            score_increment = 0
-
-        # Update the user's score
-        username = self.request.user
-        game, categories, directory = self.get_game_settings()
-        selected_category = self.request.GET.get('category', categories[0] if categories else '')
+            message = f"Incorrect. The correct answer was {correct_answer}."
 
-        best_score, best_created = BestScore.objects.get_or_create(username=username)
-        current_score, current_created = CurrentScore.objects.get_or_create(username=username)
-        score_field_prefix = selected_category.lower().replace('-', '_')
+        # Only the image at the cursor counts, so a guess sent again from a stale page can not score twice
+        scored = False
+        seed, size, cursor = self.get_deck(category, len(images))
+        if cursor < size and Deck(seed, size)[cursor] == image_index:
+            # Not advanced when the game state was already used for this image, e.g. a replayed token
+            if self.game_state.advance_deck(category, [seed, size, cursor]):
+                scored = correct
 
-        current_score_field = f"{score_field_prefix}_current_score"
-        best_score_field = f"{score_field_prefix}_best_score"
+        return correct, message, scored
 
-        current_score_val = getattr(current_score, current_score_field, 0)
-        new_current_score = current_score_val + score_increment
-        setattr(current_score, current_score_field, new_current_score)
-        current_score.save()
+    def form_valid(self, form):
+        game, categories, directory = self.get_game_settings()
+        correct, message, scored = self.check_guess(form, directory, self.get_selected_category(categories))
 
-        best_score_val = getattr(best_score, best_score_field, 0)
-        if new_current_score > best_score_val:
-            setattr(best_score, best_score_field, new_current_score)
-            best_score.save()
+        # get_context_data picks the next image, or ends the game when every image has been shown
+        context = self.get_context_data(form=form, message=message)
+        return self.render_to_response(context)
 
-        images = get_from_directory(directory, selected_category)
+    def render_to_response(self, context, **response_kwargs):
+        response = super().render_to_response(context, **response_kwargs)
+        # The browser downloads the next images while the player is guessing
+        if context.get('upcoming_images'):
+            response.headers['Link'] = ', '.join(preload_link(image) for image in context['upcoming_images'])
+        return response
 
-        # Transform filenames
-        transformed_images = [(image, base32_to_utf8(filename)) for image, filename in images]
 
-        # Update shown images in the session
-        shown_images = self.request.session.get(f'shown_images_{selected_category}', [])
-        shown_images.append(form.cleaned_data['current_image'])
-        self.request.session[f'shown_images_{selected_category}'] = shown_images
+class GuessView(GameView):
+    """
+    Takes a guess like GameView, but answers with JSON instead of re-rendering the game page:
+    the verdict, the scores and the next image to show.
+    """
+    http_method_names = ['post']
+    raise_exception = True  # Answer 403 instead of redirecting to the login page
 
-        remaining_images = [img for img in transformed_images if img[0] not in shown_images]
+    def dispatch(self, request, *args, **kwargs):
+        # With GAME_STATE = 'token' the signed game state identifies the player, the session is never read
+        if settings.GAME_STATE == 'token':
+            return super(LoginRequiredMixin, self).dispatch(request, *args, **kwargs)
+        return super().dispatch(request, *args, **kwargs)
 
-        if not remaining_images:
+    def form_valid(self, form):
+        game, categories, directory = self.get_game_settings()
+        selected_category = self.get_selected_category(categories)
+        if not self.game_state.is_valid(selected_category):
+            return JsonResponse({'status': 'fail'}, status=403)
+        correct, message, scored = self.check_guess(form, directory, selected_category)
+        return self.guess_response(correct, message, scored, directory, selected_category)
+
+    def guess_response(self, correct, message, scored, directory, selected_category):
+        """
+        Returns the JSON answer to a guess, with the next image of the deck.\n
+        A correct guess sent again for an image already scored is correct but scores nothing.
+        """
+        images = asset_catalog.get(directory, selected_category)
+        next_image = self.pick_image(images, selected_category)
+        if next_image is None:
             message = 'Congratulations! You have guessed all the images in this category.'
-            self.request.session[f'shown_images_{selected_category}'] = []
-            context = self.get_context_data(
-                form=form,
-                categories=categories,
-                selected_category=selected_category,
-                message=message,
-                all_guessed=True
-            )
+            upcoming_images = []
         else:
-            random_image = random.choice(remaining_images)
-            context = self.get_context_data(
-                form=form,
-                categories=categories,
-                selected_category=selected_category,
-                current_image=random_image[0],
-                correct_answer=random_image[1],
-                message=message,
-                all_guessed=False
-            )
+            upcoming_images = self.get_upcoming_images(images, selected_category)
+        current_score, best_score = self.get_scores(selected_category)
+
+        # The next images are preloaded by the page script, browsers ignore Link headers on fetch responses
+        return JsonResponse({
+            'correct': correct,
+            'message': message,
+            'score_increment': 1 if scored else 0,
+            'current_score': current_score,
+            'best_score': best_score,
+            'all_guessed': next_image is None,
+            'next_image': None if next_image is None else image_json(next_image),
+            'preload': [image_json(image) for image in upcoming_images],
+            'game_state': self.game_state.dumps(),
+        })
+
+    def form_invalid(self, form):
+        return JsonResponse({'errors': form.errors}, status=400)
 
-        return self.render_to_response(context)
 
 # file deepcode ignore DisablesCSRFProtection: <not a security issue>
 @csrf_exempt
 def reset_current_score(request):
     if request.method == 'POST':
-        categories = ['Afrique', 'Amerique', 'Asie', 'Europe', 'Moyen-Orient', 'Oceanie', 'World', 'Pride']
-        username = request.user.username
-
-        try:
-            score = CurrentScore.objects.get(username=username)
-        except CurrentScore.DoesNotExist:
-            score = CurrentScore(username=username)
-
-        # Iterate over each category and reset the corresponding score
-        for category in categories:
-            score_field_prefix = category.lower().replace('-', '_')
-            current_score_field = f"{score_field_prefix}_current_score"
-            if hasattr(score, current_score_field):
-                setattr(score, current_score_field, 0)
-
-        score.save()
+        reset_current_scores(request.user.username)
         return JsonResponse({'status': 'success'})
 
     return JsonResponse({'status': 'fail'}, status=400)
@@ -256,41 +441,90 @@ def reset_current_score(request):
 
 class LeaderboardView(TemplateView):
     template_name = 'leaderboard.html'
+    paginate_by = 50
+
+    def get_page(self):
+        try:
+            return max(int(self.request.GET.get('page', 1)), 1)
+        except ValueError:
+            return 1
+
+    def get_cursor(self):
+        """
+        Returns the (total best score, username) given by the "total:username" of the last row of the previous page.
+        """
+        cursor = self.request.GET.get('after')
+        if cursor:
+            total_best_score, _, username = cursor.partition(':')
+            if total_best_score.isdigit():
+                return int(total_best_score), username
+        return None
+
+    def get_leaderboard(self, page, after):
+        # Fetch one more row to know if there is a next page
+        if settings.LEADERBOARD_RANKING:
+            return get_ranked_leaderboard((page - 1) * self.paginate_by, self.paginate_by + 1, after)
+        return get_leaderboard((page - 1) * self.paginate_by, self.paginate_by + 1, after)
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        categories = ['Afrique', 'Amerique', 'Asie', 'Europe', 'Moyen-Orient', 'Oceanie', 'World', 'Pride']
-        scores = BestScore.objects.all()
+        page = self.get_page()
+        leaderboard = self.get_leaderboard(page, self.get_cursor())
 
-        leaderboard = []
+        if len(leaderboard) > self.paginate_by:
+            leaderboard = leaderboard[:self.paginate_by]
+            last = leaderboard[-1]
+            context['next_page'] = page + 1
+            context['next_cursor'] = f"{last['total_best_score']}:{last['username']}"
+        if page > 1:
+            context['previous_page'] = page - 1
 
-        for score in scores:
-            if score.username:
-                user_scores = {
-                    'username': score.username,
-                    'total_best_score': 0,
-                    'scores': {},
-                    'categories_count': 0
-                }
-
-                for category in categories:
-                    best_score_field = f"{category.lower().replace('-', '_')}_best_score"
-                    best_score = getattr(score, best_score_field, 0)
-                    user_scores['scores'][category] = best_score
-                    user_scores['total_best_score'] += best_score
-                    user_scores['categories_count'] += 1
-
-                if user_scores['categories_count'] > 0:
-                    user_scores['average_best_score'] = round(user_scores['total_best_score'] / user_scores['categories_count'])
-                else:
-                    user_scores['average_best_score'] = 0  # Handle case where user has no scores
+        context['leaderboard'] = leaderboard
+        context['categories'] = CATEGORIES
 
-                leaderboard.append(user_scores)
+        # "Your position" widget
+        if settings.LEADERBOARD_RANKING and self.request.user.is_authenticated:
+            context['user_rank'] = ranking.rank_of(self.request.user.username)
+            context['user_neighbours'] = ranking.around(self.request.user.username, 2)
 
-        # Sort users by the average score in descending order
-        leaderboard = sorted(leaderboard, key=lambda x: x['average_best_score'], reverse=True)
+        return context
 
-        context['leaderboard'] = leaderboard
-        context['categories'] = categories
 
-        return context
+@require_safe
+def serve_static(request, path):
+    """
+    Serves the collected static files, or the files of the static directories before collectstatic.\n
+    Files with a hashed name never change, browsers keep them for a year without revalidating.
+    Other files are revalidated with their ETag and answered 304 when they did not change.
+    """
+    try:
+        full_path = safe_join(settings.STATIC_ROOT, path) if settings.STATIC_ROOT else None
+    except SuspiciousFileOperation:
+        raise Http404
+    if not full_path or not os.path.isfile(full_path):
+        full_path = finders.find(path)
+        if not full_path:
+            raise Http404
+
+    content_hash = staticfiles_storage.content_hash(path)
+    etag = f'"{content_hash}"' if content_hash else file_etag(full_path)
+
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = FileResponse(open(full_path, 'rb'))
+    response.headers['ETag'] = etag
+    if content_hash:
+        response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    else:
+        response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+@require_safe
+def metrics(request):
+    """
+    Exports the metrics of every worker in the Prometheus text format, to the addresses of settings.METRICS_ALLOWED_IPS.
+    """
+    if request.META.get('REMOTE_ADDR') not in settings.METRICS_ALLOWED_IPS:
+        raise PermissionDenied
+    return HttpResponse(metrics_store.export(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -85,7 +85,7 @@ def CountryName_to_image(country_name:str, save_path='', gdf=World_gdf):
     else:    
         plt.savefig(save_path, bbox_inches='tight', pad_inches=0)
         # file deepcode ignore PT: <sanitazing isn't detected>
-        ptw.convert_png_to_webp(save_path, BASE32decoding=BASE32decoding, BASE32encoding=BASE32encoding)
+        ptw.convert_png_to_webp(save_path, BASE32decoding=BASE32decoding, BASE32encoding=BASE32encoding, assets_path=os.path.dirname(country_folder))
 
     plt.close()
         
@@ -139,6 +139,9 @@ def update_folder(country_folder:str, folder:str):
                 
             update_image(country_name, folder, image)
 
+    # the gallery atlas of the folder holds the new images
+    ptw.save_atlas(os.path.join(country_folder, folder), os.path.dirname(country_folder))
+
 
 def auto_update_countries(country_folder:str, threaded:bool=False):
     """
@@ -1,13 +1,87 @@
+import json
 import os
-from PIL import Image
+from PIL import Image, features
 
 import sys
 sys.path.append('Flagdle\game')
 from Base32EncoderDecoder import utf8_to_base32, base32_to_utf8
 
-def convert_png_to_webp(img_path:str,BASE32decoding=0, BASE32encoding=0):
+# Responsive copies of the assets, served by the game next to the full size images
+VARIANTS_FOLDER = 'Flagdle/variants'
+VARIANT_WIDTHS = (320, 640, 960)
+# AVIF needs Pillow >= 11.3
+VARIANT_FORMATS = ('avif', 'webp') if features.check('avif') else ('webp',)
+
+# Thumbnails of the gallery atlases fit in a square of this size, atlases are at most ATLAS_WIDTH wide
+ATLAS_THUMBNAIL_SIZE = 160
+ATLAS_WIDTH = 2048
+
+def save_variants(img_path:str, assets_path:str, variants_path=VARIANTS_FOLDER, widths=VARIANT_WIDTHS, formats=VARIANT_FORMATS):
+    """
+    Save smaller copies of an image in every format, for the srcset of the pages.
+    The copies are named <name>.<width>w.<format> and saved in variants_path, in the same folders as the image in assets_path.
+    The image itself is the WEBP copy at full width.
+    """
+    img_path = os.path.abspath(img_path)
+    relative_folder = os.path.relpath(os.path.dirname(img_path), os.path.abspath(assets_path))
+    output_folder = os.path.join(variants_path, relative_folder)
+    os.makedirs(output_folder, exist_ok=True)
+    filename = os.path.splitext(os.path.basename(img_path))[0]
+
+    with Image.open(img_path) as image:
+        for width in [width for width in widths if width < image.width] + [image.width]:
+            height = round(image.height * width / image.width)
+            resized = image if width == image.width else image.resize((width, height), Image.LANCZOS)
+            for image_format in formats:
+                if width == image.width and image_format == 'webp':
+                    continue
+                resized.save(os.path.join(output_folder, f'{filename}.{width}w.{image_format}'), image_format.upper())
+
+
+def save_atlas(folder:str, assets_path:str, variants_path=VARIANTS_FOLDER, thumbnail_size=ATLAS_THUMBNAIL_SIZE, atlas_width=ATLAS_WIDTH):
+    """
+    Pack thumbnails of all images of a category folder into a single atlas.webp, so a gallery loads in one request.
+    The position of each thumbnail is saved in atlas.json: {"width", "height", "images": {filename: [x, y, width, height]}}.
+    Both files are saved in variants_path, in the same folder as the category in assets_path.
+    """
+    folder = os.path.abspath(folder)
+    output_folder = os.path.join(variants_path, os.path.relpath(folder, os.path.abspath(assets_path)))
+    os.makedirs(output_folder, exist_ok=True)
+
+    thumbnails = {}
+    for filename in sorted(os.listdir(folder)):
+        if filename.endswith('.webp') and 'icon' not in filename:
+            with Image.open(os.path.join(folder, filename)) as image:
+                thumbnail = image.convert('RGBA')
+            thumbnail.thumbnail((thumbnail_size, thumbnail_size), Image.LANCZOS)
+            thumbnails[filename] = thumbnail
+
+    # Shelf packing: thumbnails are placed left to right, a new row starts when the atlas is full
+    positions = {}
+    x = y = row_height = width = 0
+    for filename, thumbnail in thumbnails.items():
+        if x + thumbnail.width > atlas_width:
+            x, y, row_height = 0, y + row_height, 0
+        positions[filename] = [x, y, thumbnail.width, thumbnail.height]
+        x += thumbnail.width
+        width = max(width, x)
+        row_height = max(row_height, thumbnail.height)
+    height = y + row_height
+    if not positions:
+        return
+
+    atlas = Image.new('RGBA', (width, height))
+    for filename, (x, y, _, _) in positions.items():
+        atlas.paste(thumbnails[filename], (x, y))
+    atlas.save(os.path.join(output_folder, 'atlas.webp'), 'WEBP', quality=80)
+    with open(os.path.join(output_folder, 'atlas.json'), 'w', encoding='utf-8') as index_file:
+        json.dump({'width': width, 'height': height, 'images': positions}, index_file)
+
+
+def convert_png_to_webp(img_path:str,BASE32decoding=0, BASE32encoding=0, assets_path=''):
     """
     Convert a PNG image to a WEBP image.
+    If assets_path (the root of the assets) is given, the responsive variants of the image are saved too.
     """        
     if not os.path.isfile(img_path):
         raise FileNotFoundError(f'File {img_path} does not exist.')
@@ -39,6 +113,10 @@ def convert_png_to_webp(img_path:str,BASE32decoding=0, BASE32encoding=0):
             os.remove(base32_path)
             
         os.rename(output_path, base32_path)
+        output_path = base32_path
+
+    if assets_path:
+        save_variants(output_path, assets_path)
 
     try:
         os.remove(img_path)
@@ -54,7 +132,7 @@ def convert_png_to_webp(img_path:str,BASE32decoding=0, BASE32encoding=0):
     
 
 
-def convert_folders_png_to_webp(input_path:str, BASE32decoding=0, BASE32encoding=0):
+def convert_folders_png_to_webp(input_path:str, BASE32decoding=0, BASE32encoding=0, assets_path=''):
     """
     Convert all PNG images in a folder to WEBP images.
     """
@@ -63,10 +141,25 @@ def convert_folders_png_to_webp(input_path:str, BASE32decoding=0, BASE32encoding
     for root, _, files in os.walk(input_path):
         for filename in files:
             file_path = os.path.join(root, filename)
-            convert_png_to_webp(file_path, BASE32decoding, BASE32encoding)
+            convert_png_to_webp(file_path, BASE32decoding, BASE32encoding, assets_path)
             print(f'Converted and deleted {file_path.split(input_path)[1][1:]} to WEBP.')
 
 
+def save_folders_variants(input_path:str, assets_path:str):
+    """
+    Save the responsive variants of all WEBP images in a folder, e.g. after updating the variant widths.
+    """
+    if not os.path.isdir(input_path):
+        raise FileNotFoundError(f'Folder {input_path} does not exist.')
+    for root, _, files in os.walk(input_path):
+        for filename in files:
+            if filename.endswith('.webp') and 'icon' not in filename:
+                save_variants(os.path.join(root, filename), assets_path)
+        if any(filename.endswith('.webp') and 'icon' not in filename for filename in files):
+            save_atlas(root, assets_path)
+        print(f'Saved the variants of {root}.')
+
+
 if __name__ == '__main__':
     root_folder = "Flagdle/assets/flags/Pride"
     BASE32decoding, BASE32encoding = 0, 1